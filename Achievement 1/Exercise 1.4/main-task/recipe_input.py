@@ -1,7 +1,10 @@
 # Part 1: recipe_input.py Script
-# This script takes recipes from the user and stores them in a binary file
+# This script takes recipes from the user and stores them in a recipe store
+# (an append-only log plus an ingredient index, see recipe_store.py)
 
-import pickle
+import os
+
+from recipe_store import RecipeStore, import_pickle
 
 # Function to calculate difficulty based on cooking time and number of ingredients
 def calc_difficulty(cooking_time, num_ingredients):
@@ -65,35 +68,25 @@ def take_recipe():
 
 # Main code
 filename = input("Enter the filename where you'd like to store your recipes (without extension): ")
-# Add .bin extension automatically
-filename = filename.strip() + '.bin'
+# The store is <filename>.log (the recipes), <filename>.ing and <filename>.idx (the ingredient index)
+filename = filename.strip()
 
-# Try to open and load existing recipe data
+# Try to open the existing recipe store
 try:
-    file = open(filename, 'rb')
-    data = pickle.load(file)
-    
-except FileNotFoundError:
-    print("File doesn't exist - creating a new one.")
-    data = {
-        'recipes_list': [],
-        'all_ingredients': []
-    }
-    
+    store_exists = os.path.exists(filename + '.log')
+    store = RecipeStore(filename)
+
 except Exception:
-    print("An unexpected error occurred - creating a new data structure.")
-    data = {
-        'recipes_list': [],
-        'all_ingredients': []
-    }
-    
+    print("An unexpected error occurred while opening the recipe store.")
+    raise SystemExit(1)
+
 else:
-    file.close()
-    
-finally:
-    # Extract the values from the dictionary
-    recipes_list = data['recipes_list']
-    all_ingredients = data['all_ingredients']
+    if not store_exists:
+        print("File doesn't exist - creating a new one.")
+        # Recipes saved by the former version of this script (pickled .bin file)
+        if os.path.exists(filename + '.bin'):
+            count = import_pickle(store, filename + '.bin')
+            print(f"Copied {count} recipes from {filename}.bin.")
 
 
 # Ask user how many recipes they want to enter
@@ -104,22 +97,10 @@ for i in range(num_recipes):
     print(f"\n--- Recipe {i + 1} ---")
     recipe = take_recipe()
     
-    # Add recipe to recipes_list
-    recipes_list.append(recipe)
-    
-    # Add new ingredients to all_ingredients
-    for ingredient in recipe['ingredients']:
-        if ingredient not in all_ingredients:
-            all_ingredients.append(ingredient)
-
-# Update the data dictionary
-data = {
-    'recipes_list': recipes_list,
-    'all_ingredients': all_ingredients
-}
+    # Append the recipe to the store; its new ingredients are added to the
+    # index at the same time, nothing already stored is rewritten
+    store.add(recipe)
 
-# Write the updated data to the binary file
-with open(filename, 'wb') as file:
-    pickle.dump(data, file)
+store.close()
 
-print(f"\nRecipes saved successfully to {filename}!")
+print(f"\nRecipes saved successfully to {filename}.log!")
@@ -1,7 +1,10 @@
 # Part 2: recipe_search.py Script
-# This script searches for recipes by ingredient from a binary file
+# This script searches for recipes by ingredient from a recipe store
+# (see recipe_store.py): only the recipes containing the ingredient are loaded
 
-import pickle
+import os
+
+from recipe_store import RecipeStore, import_pickle
 
 # Function to display a recipe
 def display_recipe(recipe):
@@ -23,15 +26,15 @@ def display_recipe(recipe):
 
 
 # Function to search for recipes containing a specific ingredient
-def search_ingredient(data):
+def search_ingredient(store):
     """
     Search for recipes containing a specific ingredient.
     
     Args:
-        data (dict): Dictionary containing recipes_list and all_ingredients
+        store (RecipeStore): the recipe store to search
     """
-    # Display all available ingredients
-    all_ingredients = data['all_ingredients']
+    # Display all available ingredients (read from the index only)
+    all_ingredients = store.ingredients()
     
     print("\nAvailable ingredients:")
     print("-" * 50)
@@ -57,39 +60,40 @@ def search_ingredient(data):
         return
     
     else:
-        # Search for recipes containing the selected ingredient
-        recipes_list = data['recipes_list']
-        found = False
+        # Load only the recipes the index lists for the selected ingredient
+        matching_recipes = store.search(ingredient_searched)
         
         print(f"\nRecipes containing '{ingredient_searched}':")
         
-        for recipe in recipes_list:
-            if ingredient_searched in recipe['ingredients']:
-                display_recipe(recipe)
-                found = True
+        for recipe in matching_recipes:
+            display_recipe(recipe)
         
-        if not found:
+        if not matching_recipes:
             print(f"\nNo recipes found containing '{ingredient_searched}'.")
 
 
 # Main code
 filename = input("Enter the filename where your recipes are stored (without extension): ")
-# Add .bin extension automatically
-filename = filename.strip() + '.bin'
+# The store is <filename>.log (the recipes), <filename>.ing and <filename>.idx (the ingredient index)
+filename = filename.strip()
 
-# Try to open and load the recipe data
+# Try to open the recipe store
 try:
-    file = open(filename, 'rb')
-    data = pickle.load(file)
+    if not os.path.exists(filename + '.log') and not os.path.exists(filename + '.bin'):
+        raise FileNotFoundError(filename + '.log')
+    store = RecipeStore(filename)
     
 except FileNotFoundError:
-    print(f"Error: File '{filename}' not found.")
+    print(f"Error: File '{filename}.log' not found.")
     print("Please make sure you've created recipes using recipe_input.py first.")
     
 except Exception:
     print("Error: An unexpected error occurred while loading the file.")
     
 else:
-    file.close()
+    # Recipes saved by the former version of recipe_input.py (pickled .bin file)
+    if len(store) == 0 and os.path.exists(filename + '.bin'):
+        import_pickle(store, filename + '.bin')
     # Call search_ingredient function
-    search_ingredient(data)
+    search_ingredient(store)
+    store.close()
@@ -0,0 +1,541 @@
+# recipe_store.py
+# Append-only, indexed storage for the recipes of recipe_input.py and recipe_search.py
+#
+# A store named "recipes" is three files:
+#   recipes.log - the records, only ever appended to:
+#                 1 byte kind + 4 bytes length + pickled payload
+#   recipes.ing - a checkpoint of the index, read through mmap and never loaded:
+#                 a header, the sorted offsets of the live recipes (8 bytes each),
+#                 then one line per ingredient, sorted by ingredient
+#                 ("<ingredient>\t<rank>\t<name as first added>\t<offset>,<offset>...")
+#   recipes.idx - the journal of the records added to the log since the
+#                 checkpoint, one text line each: "+\t<offset>\t<ingredient>..."
+#                 for a recipe, "-\t<offset>\t<deleted offset>" for a deletion
+#
+# Adding a recipe appends to the log and the journal, without rewriting
+# anything. Once the journal has CHECKPOINT_LINES lines, it is merged into a
+# new checkpoint. Opening the store reads the header of the checkpoint and the
+# (short) journal only, so it takes the same time however many recipes there
+# are; searching one ingredient is a binary search in the checkpoint, then
+# only the matching records are unpickled, read through mmap. Deleting
+# appends a tombstone; compact() rewrites the files with the live recipes only.
+#
+# Usage: python recipe_store.py compact <store name>
+
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+# the ingredient registry is shared by the recipe scripts of Achievement 1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from ingredient_registry import IngredientRegistry
+
+LOG_MAGIC = b'RECLOG1\n'
+INDEX_MAGIC = 'RECIDX2'
+CHECKPOINT_MAGIC = b'RECING1\n'
+
+# the log starts with LOG_MAGIC and a random id, which the checkpoint and the
+# journal repeat: the index files of another log (e.g. after an interrupted
+# compact()) are recognized and rebuilt
+LOG_ID_SIZE = 16
+LOG_START = len(LOG_MAGIC) + LOG_ID_SIZE
+
+# record kinds
+RECIPE = 1
+DELETE = 2
+
+# kind (1 byte) and payload length (4 bytes), little endian
+HEADER = struct.Struct('<BI')
+
+# checkpoint header after the magic and the log id: end of the log it covers,
+# number of live recipes, next ingredient rank
+CHECKPOINT_HEADER = struct.Struct('<QQQ')
+CHECKPOINT_START = len(CHECKPOINT_MAGIC) + LOG_ID_SIZE + CHECKPOINT_HEADER.size
+OFFSET = struct.Struct('<Q')
+
+# journal lines replayed when the store is opened, at most
+CHECKPOINT_LINES = 1000
+
+
+def clean_ingredient(ingredient):
+    """
+    Return the ingredient as it is stored in the index: tabs and line breaks
+    would break the index lines, so all whitespace becomes single spaces.
+    """
+    return ' '.join(ingredient.split())
+
+
+class RecipeStore:
+    """
+    A recipe store: an append-only log of pickled recipes plus an ingredient index.
+
+    Args:
+        name (str): path of the store without extension (e.g. "recipes")
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.log_path = name + '.log'
+        self.index_path = name + '.idx'
+        self.checkpoint_path = name + '.ing'
+        # compact() builds its new files without checkpoints along the way
+        self.auto_checkpoint = True
+        self._open()
+
+    def _open(self):
+        """Open the files of the store, repairing what an interruption left behind."""
+        self._map = None
+        self._checkpoint_map = None
+        # state of the checkpoint (nothing until the first one)
+        self.base_end = LOG_START       # end of the log the checkpoint covers
+        self.base_live = 0              # live recipes in the checkpoint
+        self.base_next_rank = 0         # rank of the next new ingredient
+        self.base_lines = 0             # where the ingredient lines begin
+        # the records of the journal
+        self.registry = IngredientRegistry()    # ingredients of the journal, in insertion order
+        self.postings = {}      # ingredient id (in registry) -> offsets of the recipes using it
+        self.live = {}          # offset -> ingredient ids, for the journal's recipes not deleted
+        self.deleted = set()    # offsets of the checkpoint's recipes deleted since
+        self.journal_lines = 0
+
+        # a log left empty by an interruption is started again
+        new_store = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
+        self.log = open(self.log_path, 'a+b')
+        if new_store:
+            self.log.write(LOG_MAGIC + os.urandom(LOG_ID_SIZE))
+            self.log.flush()
+        elif self._read(0, len(LOG_MAGIC)) != LOG_MAGIC:
+            self.log.close()
+            raise ValueError(f"'{self.log_path}' is not a recipe log")
+        self.log_id = self._read(len(LOG_MAGIC), LOG_ID_SIZE)
+
+        self._open_checkpoint()
+        self.indexed_end = self.base_end
+        self.index_header = f'{INDEX_MAGIC} {self.log_id.hex()} {self.base_end}\n'
+        valid_end = self._load_index()
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) != valid_end:
+            # drop a torn last line, or all of an unreadable or outdated journal
+            os.truncate(self.index_path, valid_end)
+        self.index = open(self.index_path, 'a', encoding='utf-8')
+        if self.index.tell() == 0:
+            self.index.write(self.index_header)
+            self.index.flush()
+        self._index_tail()
+        self._maybe_checkpoint()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the files of the store."""
+        for mapped in (self._map, self._checkpoint_map):
+            if mapped is not None:
+                mapped.close()
+        self._map = None
+        self._checkpoint_map = None
+        self.log.close()
+        self.index.close()
+
+    # ---- reading ----
+
+    def _read(self, offset, size):
+        """Read size bytes of the log at offset, through mmap."""
+        end = offset + size
+        if self._map is None or end > len(self._map):
+            # the log grew since it was mapped (or was never mapped)
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.log.flush()
+            length = os.path.getsize(self.log_path)
+            if end > length or length == 0:
+                raise ValueError('record past the end of the log')
+            self._map = mmap.mmap(self.log.fileno(), length, access=mmap.ACCESS_READ)
+        return self._map[offset:end]
+
+    def _record(self, offset):
+        """Return (kind, payload bytes, offset of the next record) of the record at offset."""
+        kind, length = HEADER.unpack(self._read(offset, HEADER.size))
+        start = offset + HEADER.size
+        return kind, self._read(start, length), start + length
+
+    def get(self, offset):
+        """
+        Load the recipe stored at offset.
+
+        Args:
+            offset (int): position of the record in the log
+
+        Returns:
+            dict: the recipe
+        """
+        kind, payload, _ = self._record(offset)
+        if kind != RECIPE:
+            raise ValueError(f'no recipe at offset {offset}')
+        return pickle.loads(payload)
+
+    def ingredients(self):
+        """Return the ingredients of the stored recipes, in the order they were first added."""
+        ranked = []
+        in_checkpoint = set()
+        for key, rank, name, offsets in self._checkpoint_lines():
+            in_checkpoint.add(key)
+            ingredient_id = self.registry.id_of(key)
+            if (any(offset not in self.deleted for offset in offsets)
+                    or ingredient_id is not None and self.postings[ingredient_id]):
+                ranked.append((rank, name))
+        # the ingredients the journal added since the checkpoint
+        for ingredient_id, offsets in self.postings.items():
+            name = self.registry[ingredient_id]
+            if offsets and self.registry.normalize(name) not in in_checkpoint:
+                ranked.append((self.base_next_rank + ingredient_id, name))
+        return [name for _, name in sorted(ranked)]
+
+    def search(self, ingredient):
+        """
+        Return the recipes containing the ingredient, loading only those.
+
+        Args:
+            ingredient (str): the ingredient to look for
+
+        Returns:
+            list: the matching recipe dictionaries
+        """
+        return [self.get(offset) for offset in self._offsets_of(ingredient)]
+
+    def _offsets_of(self, ingredient):
+        """Return the offsets of the live recipes containing the ingredient."""
+        key = self.registry.normalize(ingredient)
+        line = self._find_line(key)
+        offsets = [offset for offset in line[3] if offset not in self.deleted] if line else []
+        ingredient_id = self.registry.id_of(key)
+        if ingredient_id is not None:
+            offsets += self.postings[ingredient_id]
+        return offsets
+
+    def __iter__(self):
+        """Iterate over the stored recipes, oldest first."""
+        for offset in self._offsets():
+            yield self.get(offset)
+
+    def _offsets(self):
+        """Iterate over the offsets of the live recipes, in log order."""
+        for i in range(self.base_live):
+            offset = OFFSET.unpack_from(self._checkpoint_map, CHECKPOINT_START + i * OFFSET.size)[0]
+            if offset not in self.deleted:
+                yield offset
+        yield from list(self.live)
+
+    def __len__(self):
+        return self.base_live - len(self.deleted) + len(self.live)
+
+    # ---- writing ----
+
+    def _append_record(self, kind, payload):
+        self.log.seek(0, os.SEEK_END)
+        offset = self.log.tell()
+        self.log.write(HEADER.pack(kind, len(payload)) + payload)
+        self.log.flush()
+        return offset
+
+    def add(self, recipe):
+        """
+        Append a recipe to the store.
+
+        Args:
+            recipe (dict): the recipe, with an 'ingredients' list
+
+        Returns:
+            int: the offset of the recipe in the log, which identifies it
+        """
+        ingredients = [clean_ingredient(ingredient) for ingredient in recipe['ingredients']]
+        payload = pickle.dumps(recipe)
+        offset = self._append_record(RECIPE, payload)
+        # the log is written first: a crash in between is repaired by _index_tail
+        self.index.write('\t'.join(['+', str(offset)] + ingredients) + '\n')
+        self.index.flush()
+        self._add_to_index(offset, ingredients)
+        self.indexed_end = offset + HEADER.size + len(payload)
+        self._maybe_checkpoint()
+        return offset
+
+    def delete(self, offset):
+        """
+        Delete the recipe at offset (its record stays in the log until compact()).
+
+        Args:
+            offset (int): the offset returned by add()
+        """
+        if not self._is_live(offset):
+            raise KeyError(offset)
+        record_offset = self._append_record(DELETE, struct.pack('<Q', offset))
+        self.index.write(f'-\t{record_offset}\t{offset}\n')
+        self.index.flush()
+        self._remove_from_index(offset)
+        self.indexed_end = record_offset + HEADER.size + 8
+        self._maybe_checkpoint()
+
+    def compact(self):
+        """Rewrite the log and the index with the live recipes only."""
+        temp_name = self.name + '.compact'
+        for extension in ('.log', '.idx', '.ing'):
+            if os.path.exists(temp_name + extension):
+                os.remove(temp_name + extension)
+        with RecipeStore(temp_name) as compacted:
+            compacted.auto_checkpoint = False
+            for recipe in self:
+                compacted.add(recipe)
+            compacted.checkpoint()
+
+        self.close()
+        # if interrupted in between, the index files don't match the id of
+        # the new log and are rebuilt when the store is opened
+        for extension in ('.log', '.ing', '.idx'):
+            os.replace(temp_name + extension, self.name + extension)
+        self._open()
+
+    # ---- checkpoint ----
+
+    def _open_checkpoint(self):
+        """Map the checkpoint file, if there is one for this log, and read its header."""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, 'rb') as checkpoint:
+            header = checkpoint.read(CHECKPOINT_START)
+            if (len(header) < CHECKPOINT_START or not header.startswith(CHECKPOINT_MAGIC)
+                    or header[len(CHECKPOINT_MAGIC):len(CHECKPOINT_MAGIC) + LOG_ID_SIZE] != self.log_id):
+                return      # damaged, or the checkpoint of another log: the journal is rebuilt from the log
+            base_end, base_live, base_next_rank = CHECKPOINT_HEADER.unpack_from(
+                header, CHECKPOINT_START - CHECKPOINT_HEADER.size)
+            if base_end > os.path.getsize(self.log_path):
+                return
+            self._checkpoint_map = mmap.mmap(checkpoint.fileno(), 0, access=mmap.ACCESS_READ)
+        self.base_end, self.base_live, self.base_next_rank = base_end, base_live, base_next_rank
+        self.base_lines = CHECKPOINT_START + base_live * OFFSET.size
+
+    def _parse_line(self, start):
+        """Return (ingredient, rank, name, offsets) of the checkpoint line at start, and the next line's start."""
+        end = self._checkpoint_map.find(b'\n', start)
+        key, rank, name, offsets = self._checkpoint_map[start:end].decode('utf-8').split('\t')
+        return (key, int(rank), name, [int(offset) for offset in offsets.split(',')]), end + 1
+
+    def _checkpoint_lines(self):
+        """Iterate over the ingredient lines of the checkpoint, in ingredient order."""
+        if self._checkpoint_map is None:
+            return
+        position = self.base_lines
+        while position < len(self._checkpoint_map):
+            line, position = self._parse_line(position)
+            yield line
+
+    def _find_line(self, key):
+        """Return the checkpoint line of the ingredient (binary search in the file), or None."""
+        if self._checkpoint_map is None:
+            return None
+        target = key.encode('utf-8')
+        checkpoint = self._checkpoint_map
+        # every line before low is for a smaller ingredient, every line from high on is not
+        low, high = self.base_lines, len(checkpoint)
+        while low < high:
+            middle = (low + high) // 2
+            # the first line starting at or after middle
+            start = checkpoint.find(b'\n', middle - 1) + 1 if middle > low else low
+            if start >= high:
+                start = low
+            if checkpoint[start:checkpoint.find(b'\t', start)] < target:
+                low = checkpoint.find(b'\n', start) + 1
+            else:
+                high = start
+        if low < len(checkpoint) and checkpoint[low:checkpoint.find(b'\t', low)] == target:
+            return self._parse_line(low)[0]
+        return None
+
+    def _is_live(self, offset):
+        if offset in self.live:
+            return True
+        if offset >= self.base_end or offset in self.deleted:
+            return False
+        # binary search in the sorted offsets of the checkpoint
+        low, high = 0, self.base_live
+        while low < high:
+            middle = (low + high) // 2
+            found = OFFSET.unpack_from(self._checkpoint_map, CHECKPOINT_START + middle * OFFSET.size)[0]
+            if found == offset:
+                return True
+            if found < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def _maybe_checkpoint(self):
+        if self.auto_checkpoint and self.journal_lines >= CHECKPOINT_LINES:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Merge the journal into a new checkpoint, and start an empty journal."""
+        live = list(self._offsets())
+        # the journal's ingredients, merged into the sorted lines of the checkpoint
+        added = sorted(
+            (self.registry.normalize(self.registry[ingredient_id]).encode('utf-8'), ingredient_id)
+            for ingredient_id, offsets in self.postings.items() if offsets
+        )
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'wb') as checkpoint:
+            checkpoint.write(CHECKPOINT_MAGIC + self.log_id)
+            next_rank = self.base_next_rank + len(self.registry)
+            checkpoint.write(CHECKPOINT_HEADER.pack(self.indexed_end, len(live), next_rank))
+            for offset in live:
+                checkpoint.write(OFFSET.pack(offset))
+            for key, rank, name, offsets in self._merged_lines(added):
+                line = '\t'.join([key, str(rank), name, ','.join(map(str, offsets))]) + '\n'
+                checkpoint.write(line.encode('utf-8'))
+
+        # the new checkpoint covers the whole journal; if interrupted between
+        # the two, the journal doesn't match the checkpoint and is rebuilt
+        self.close()
+        os.replace(temp_path, self.checkpoint_path)
+        with open(self.index_path, 'w', encoding='utf-8') as index:
+            index.write(f'{INDEX_MAGIC} {self.log_id.hex()} {self.indexed_end}\n')
+        self._open()
+
+    def _merged_lines(self, added):
+        """Iterate over the lines of the new checkpoint (the old ones and the journal's), in ingredient order."""
+        added = iter(added)
+        pending = next(added, None)
+        for key, rank, name, offsets in self._checkpoint_lines():
+            encoded = key.encode('utf-8')
+            while pending is not None and pending[0] < encoded:
+                yield self._journal_line(pending)
+                pending = next(added, None)
+            offsets = [offset for offset in offsets if offset not in self.deleted]
+            if pending is not None and pending[0] == encoded:
+                offsets += self.postings[pending[1]]
+                pending = next(added, None)
+            if offsets:
+                yield key, rank, name, offsets
+        while pending is not None:
+            yield self._journal_line(pending)
+            pending = next(added, None)
+
+    def _journal_line(self, pending):
+        key, ingredient_id = pending
+        rank = self.base_next_rank + ingredient_id
+        return key.decode('utf-8'), rank, self.registry[ingredient_id], self.postings[ingredient_id]
+
+    # ---- journal ----
+
+    def _add_to_index(self, offset, ingredients):
+        ingredient_ids = []
+        for ingredient in ingredients:
+            ingredient_id = self.registry.add(ingredient)
+            # an ingredient listed twice in a recipe is indexed once
+            if ingredient_id not in ingredient_ids:
+                ingredient_ids.append(ingredient_id)
+                self.postings.setdefault(ingredient_id, []).append(offset)
+        self.live[offset] = ingredient_ids
+        self.journal_lines += 1
+
+    def _remove_from_index(self, offset):
+        if offset in self.live:
+            for ingredient_id in self.live.pop(offset):
+                self.postings[ingredient_id].remove(offset)
+        elif self._is_live(offset):
+            self.deleted.add(offset)
+        self.journal_lines += 1
+
+    def _load_index(self):
+        """
+        Read the journal (the log itself is not read).
+
+        Returns:
+            int: the size of the readable part of the journal
+        """
+        if not os.path.exists(self.index_path):
+            return 0
+        last = None
+        with open(self.index_path, 'rb') as index:
+            if index.readline() != self.index_header.encode():
+                # damaged, or not the journal of this checkpoint: rebuilt from the log by _index_tail
+                return 0
+            valid_end = index.tell()
+            for line in index:
+                if not line.endswith(b'\n'):
+                    break       # torn last line
+                fields = line.decode('utf-8').rstrip('\n').split('\t')
+                offset = int(fields[1])
+                if fields[0] == '+':
+                    self._add_to_index(offset, fields[2:])
+                else:
+                    self._remove_from_index(int(fields[2]))
+                last = offset
+                valid_end += len(line)
+        if last is not None:
+            self.indexed_end = self._record(last)[2]
+        return valid_end
+
+    def _index_tail(self):
+        """Index the records of the log the journal doesn't cover (after a crash)."""
+        self.log.seek(0, os.SEEK_END)
+        end = self.log.tell()
+        offset = self.indexed_end
+        while offset + HEADER.size <= end:
+            kind, length = HEADER.unpack(self._read(offset, HEADER.size))
+            if offset + HEADER.size + length > end:
+                break       # torn last record
+            if kind == RECIPE:
+                recipe = pickle.loads(self._read(offset + HEADER.size, length))
+                ingredients = [clean_ingredient(ingredient) for ingredient in recipe['ingredients']]
+                self.index.write('\t'.join(['+', str(offset)] + ingredients) + '\n')
+                self._add_to_index(offset, ingredients)
+            elif kind == DELETE and length == OFFSET.size:
+                target = OFFSET.unpack(self._read(offset + HEADER.size, length))[0]
+                self.index.write(f'-\t{offset}\t{target}\n')
+                self._remove_from_index(target)
+            else:
+                break       # not a record: what follows can't be framed either
+            offset += HEADER.size + length
+        self.index.flush()
+        self.indexed_end = offset
+        if offset < end:
+            # cut what is left of a torn record, or the next add() would be
+            # appended after it and read as part of it
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.log.truncate(offset)
+            self.log.flush()
+
+
+def import_pickle(store, filename):
+    """
+    Copy the recipes of a pickled .bin file (the former format of
+    recipe_input.py) into the store.
+
+    Args:
+        store (RecipeStore): the store to add the recipes to
+        filename (str): path of the .bin file
+
+    Returns:
+        int: the number of recipes copied
+    """
+    with open(filename, 'rb') as file:
+        data = pickle.load(file)
+    for recipe in data['recipes_list']:
+        store.add(recipe)
+    return len(data['recipes_list'])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'compact':
+        print('Usage: python recipe_store.py compact <store name>')
+        sys.exit(1)
+    with RecipeStore(sys.argv[2]) as recipe_store:
+        before = os.path.getsize(recipe_store.log_path)
+        recipe_store.compact()
+        print(f'Compacted {recipe_store.log_path}: {before} -> {os.path.getsize(recipe_store.log_path)} bytes')
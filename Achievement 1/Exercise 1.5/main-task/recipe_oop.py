@@ -1,6 +1,14 @@
 # Main Task: Recipe OOP
 # Exercise 1.5 - Object-Oriented Programming
 
+import os
+import sys
+
+# the ingredient registry is shared by the recipe scripts of Achievement 1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from ingredient_registry import IngredientRegistry
+
+
 class Recipe:
     """
     A class to represent recipes with ingredients and cooking time.
@@ -8,7 +16,8 @@ class Recipe:
     """
     
     # Class variable to track all ingredients across all recipes
-    all_ingredients = []
+    # (an ordered set: each ingredient once, in the order first added)
+    all_ingredients = IngredientRegistry()
     
     def __init__(self, name):
         """
@@ -112,9 +121,8 @@ class Recipe:
         Update the class variable all_ingredients with ingredients
         from this recipe that aren't already present.
         """
-        for ingredient in self._ingredients:
-            if ingredient not in Recipe.all_ingredients:
-                Recipe.all_ingredients.append(ingredient)
+        # the registry skips the ones it has, without scanning the list
+        Recipe.all_ingredients.update(self._ingredients)
     
     def __str__(self):
         """
@@ -2,6 +2,12 @@
 # Exercise 1.6 - Database Application
 
 import mysql.connector
+import os
+import sys
+
+# the ingredient registry is shared by the recipe scripts of Achievement 1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from ingredient_registry import IngredientRegistry
 
 # ============================================
 # PART 1: DATABASE CONNECTION
@@ -121,16 +127,14 @@ def search_recipe(conn, cursor):
         print("\nNo recipes found in database.")
         return
     
-    # Build list of all unique ingredients
-    all_ingredients = []
+    # Build the catalog of all unique ingredients (in the order first seen)
+    all_ingredients = IngredientRegistry()
     for row in results:
         ingredients_str = row[0]
         # Split the comma-separated string into list
         ingredients_list = [ing.strip() for ing in ingredients_str.split(',')]
         
-        for ingredient in ingredients_list:
-            if ingredient not in all_ingredients:
-                all_ingredients.append(ingredient)
+        all_ingredients.update(ingredients_list)
     
     # Display all ingredients
     print("\nAvailable ingredients:")
@@ -81,6 +81,134 @@ Difficulty: {difficulty}
 Base.metadata.create_all(engine)
 
 
+# ============================================
+# INGREDIENT INDEX
+# ============================================
+
+class IngredientIndex:
+    """
+    In-memory bitset index of the ingredients of all recipes.
+
+    Every recipe gets a bit position (its slot), and every ingredient an integer
+    id with a bitset (a Python int) of the recipes using it. ANY/ALL/NOT
+    searches are then OR/AND/AND NOT of a few ints, over all recipes at once,
+    instead of a list membership test per recipe and ingredient.
+    """
+
+    def __init__(self):
+        self.ingredient_ids = {}    # ingredient name -> id
+        self.ingredient_names = []  # id -> ingredient name
+        self.recipes_of = []        # id -> bitset of the recipe slots using it
+        self.slots = {}             # recipe id -> slot (bit position)
+        self.recipe_ids = []        # slot -> recipe id (None when free)
+        self.ingredients_of = []    # slot -> bitset of its ingredient ids
+        self.free_slots = []        # slots of deleted recipes, reused first
+        self.all_recipes = 0        # bitset of the used slots
+
+    def rebuild(self, session):
+        """Load the index from the database, reading only ids and ingredients."""
+        self.__init__()
+        for recipe_id, ingredients in session.query(Recipe).with_entities(Recipe.id, Recipe.ingredients):
+            self.add(recipe_id, ingredients.split(', ') if ingredients else [])
+
+    def ingredient_id(self, name):
+        """Return the id of an ingredient, giving it a new one if needed."""
+        if name not in self.ingredient_ids:
+            self.ingredient_ids[name] = len(self.ingredient_names)
+            self.ingredient_names.append(name)
+            self.recipes_of.append(0)
+        return self.ingredient_ids[name]
+
+    def add(self, recipe_id, ingredients):
+        """Index a new recipe (or re-index an edited one)."""
+        if recipe_id in self.slots:
+            self.remove(recipe_id)
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.recipe_ids[slot] = recipe_id
+        else:
+            slot = len(self.recipe_ids)
+            self.recipe_ids.append(recipe_id)
+            self.ingredients_of.append(0)
+        self.slots[recipe_id] = slot
+
+        bit = 1 << slot
+        mask = 0
+        for name in ingredients:
+            ingredient = self.ingredient_id(name)
+            self.recipes_of[ingredient] |= bit
+            mask |= 1 << ingredient
+        self.ingredients_of[slot] = mask
+        self.all_recipes |= bit
+
+    # an edit replaces the recipe's ingredients
+    update = add
+
+    def remove(self, recipe_id):
+        """Drop a deleted recipe from the index."""
+        slot = self.slots.pop(recipe_id, None)
+        if slot is None:
+            return
+        bit = 1 << slot
+        for ingredient in self.bits(self.ingredients_of[slot]):
+            self.recipes_of[ingredient] &= ~bit
+        self.ingredients_of[slot] = 0
+        self.recipe_ids[slot] = None
+        self.all_recipes &= ~bit
+        self.free_slots.append(slot)
+
+    def ingredients(self):
+        """Sorted names of the ingredients used by at least one recipe."""
+        return sorted(
+            name for name, recipes in zip(self.ingredient_names, self.recipes_of) if recipes
+        )
+
+    def recipes_with(self, names):
+        """Bitsets of the recipes using each of ``names`` (0 if unknown)."""
+        return [
+            self.recipes_of[self.ingredient_ids[name]] if name in self.ingredient_ids else 0
+            for name in names
+        ]
+
+    def search(self, all_of=(), any_of=(), none_of=()):
+        """Ids of the recipes with every ``all_of``, one of ``any_of`` and none of ``none_of``."""
+        matches = self.all_recipes
+        for recipes in self.recipes_with(all_of):
+            matches &= recipes
+        if any_of:
+            either = 0
+            for recipes in self.recipes_with(any_of):
+                either |= recipes
+            matches &= either
+        for recipes in self.recipes_with(none_of):
+            matches &= ~recipes
+        return [self.recipe_ids[slot] for slot in self.bits(matches)]
+
+    @staticmethod
+    def bits(mask):
+        """Positions of the set bits of ``mask``, lowest first."""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+
+# Index shared by the menu actions; loaded on first use, then kept up to date
+# by create_recipe, edit_recipe and delete_recipe
+ingredient_index = IngredientIndex()
+ingredient_index_loaded = False
+
+
+def get_ingredient_index():
+    """Return the ingredient index, loading it from the database the first time."""
+    global ingredient_index_loaded
+    if not ingredient_index_loaded:
+        ingredient_index.rebuild(session)
+        ingredient_index_loaded = True
+    return ingredient_index
+
+
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
@@ -219,6 +347,7 @@ def create_recipe():
     # Add to database
     session.add(recipe)
     session.commit()
+    get_ingredient_index().add(recipe.id, ingredients_list)
     
     print(f"\n✓ Recipe '{name}' created successfully!")
     print(f"  Difficulty: {recipe.calculate_difficulty()}")
@@ -255,16 +384,9 @@ def search_by_ingredient():
         print("\nNo recipes available to search.")
         return
     
-    # Get all unique ingredients from all recipes
-    all_recipes = session.query(Recipe).all()
-    all_ingredients = set()
-    
-    for recipe in all_recipes:
-        ingredients_list = recipe.return_ingredients_as_list()
-        all_ingredients.update(ingredients_list)
-    
-    # Convert to sorted list for display
-    all_ingredients = sorted(list(all_ingredients))
+    # Get all unique ingredients from the ingredient index (sorted)
+    index = get_ingredient_index()
+    all_ingredients = index.ingredients()
     
     # Display available ingredients
     print("\nAvailable ingredients:")
@@ -291,18 +413,34 @@ def search_by_ingredient():
         except ValueError:
             print("Error: Please enter valid numbers separated by spaces!")
     
-    # Search for recipes containing ALL selected ingredients
-    print(f"\nSearching for recipes containing: {', '.join(selected_ingredients)}")
+    # How the selected ingredients must match
+    print("\nFind recipes with:")
+    print("1. ALL selected ingredients")
+    print("2. ANY of the selected ingredients")
+    print("3. NONE of the selected ingredients")
+    while True:
+        mode = input("Enter your choice (1-3, default 1): ").strip() or '1'
+        if mode in ['1', '2', '3']:
+            break
+        print("Error: Please enter 1, 2, or 3!")
+    
+    mode_name = {'1': 'all', '2': 'any', '3': 'none'}[mode]
+    print(f"\nSearching for recipes containing {mode_name} of: {', '.join(selected_ingredients)}")
+    
+    # Bitwise search over all recipes at once, then load only the matches
+    if mode == '1':
+        recipe_ids = index.search(all_of=selected_ingredients)
+    elif mode == '2':
+        recipe_ids = index.search(any_of=selected_ingredients)
+    else:
+        recipe_ids = index.search(none_of=selected_ingredients)
     
     matching_recipes = []
-    for recipe in all_recipes:
-        recipe_ingredients = recipe.return_ingredients_as_list()
-        # Check if all selected ingredients are in this recipe
-        if all(ingredient in recipe_ingredients for ingredient in selected_ingredients):
-            matching_recipes.append(recipe)
+    if recipe_ids:
+        matching_recipes = session.query(Recipe).filter(Recipe.id.in_(recipe_ids)).order_by(Recipe.id).all()
     
     if not matching_recipes:
-        print(f"\nNo recipes found containing all selected ingredients.")
+        print(f"\nNo recipes found containing {mode_name} of the selected ingredients.")
         return
     
     print(f"\n{'='*50}")
@@ -385,6 +523,8 @@ def edit_recipe():
     
     # Commit changes
     session.commit()
+    if choice == 3:
+        get_ingredient_index().update(recipe.id, ingredients_list)
     print(f"\n✓ Recipe updated successfully!")
     print(f"  New difficulty: {recipe.calculate_difficulty()}")
 
@@ -428,6 +568,7 @@ def delete_recipe():
         if confirm in ['yes', 'y']:
             session.delete(recipe)
             session.commit()
+            get_ingredient_index().remove(recipe.id)
             print(f"\n✓ Recipe '{recipe.name}' deleted successfully!")
             break
         elif confirm in ['no', 'n']:
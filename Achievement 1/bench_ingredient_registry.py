@@ -0,0 +1,84 @@
+# bench_ingredient_registry.py
+# Micro-benchmark: building an ingredient catalog with the former
+# "if ingredient not in all_ingredients: append" list against IngredientRegistry
+#
+# Usage:
+#   python bench_ingredient_registry.py                 # 1,000 / 10,000 / 100,000 ingredients
+#   python bench_ingredient_registry.py 5000 50000      # other catalog sizes
+#
+# Every catalog is built from recipes of 8 ingredients, each unique ingredient
+# appearing in 3 recipes on average (the shape of the recipe scripts' data).
+# The list version takes several minutes at 100,000 ingredients: that is the point.
+
+import random
+import sys
+import time
+
+from ingredient_registry import IngredientRegistry
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+INGREDIENTS_PER_RECIPE = 8
+REPEATS = 3
+
+
+def make_recipes(unique_ingredients, seed=0):
+    """
+    Make the ingredient lists of random recipes using unique_ingredients ingredients.
+
+    Args:
+        unique_ingredients (int): size of the catalog the recipes should give
+
+    Returns:
+        list: lists of ingredient names, one per recipe
+    """
+    rng = random.Random(seed)
+    names = [f"Ingredient {i}" for i in range(unique_ingredients)]
+    # every ingredient is used 3 times on average, and at least once
+    uses = names * 3
+    rng.shuffle(uses)
+    return [uses[i:i + INGREDIENTS_PER_RECIPE] for i in range(0, len(uses), INGREDIENTS_PER_RECIPE)]
+
+
+def build_with_list(recipes):
+    """The former way: a list, scanned for every ingredient."""
+    all_ingredients = []
+    for ingredients in recipes:
+        for ingredient in ingredients:
+            if ingredient not in all_ingredients:
+                all_ingredients.append(ingredient)
+    return all_ingredients
+
+
+def build_with_registry(recipes):
+    """The new way: the shared ordered-set registry."""
+    all_ingredients = IngredientRegistry()
+    for ingredients in recipes:
+        all_ingredients.update(ingredients)
+    return all_ingredients
+
+
+def best_time(function, recipes, repeats):
+    """Return the best wall time of function(recipes) over repeats runs, and its result."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(recipes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(sizes):
+    print(f"{'ingredients':>12} {'list (s)':>12} {'registry (s)':>14} {'speed-up':>10}")
+    for size in sizes:
+        recipes = make_recipes(size)
+        # the quadratic version is run once at the larger sizes, it is slow enough
+        list_time, list_result = best_time(build_with_list, recipes, 1 if size > 10000 else REPEATS)
+        registry_time, registry_result = best_time(build_with_registry, recipes, REPEATS)
+        # both give the same catalog, in the same order
+        assert list_result == list(registry_result)
+        print(f"{size:>12,} {list_time:>12.4f} {registry_time:>14.4f} {list_time / registry_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
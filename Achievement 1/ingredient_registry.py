@@ -0,0 +1,99 @@
+# ingredient_registry.py
+# Shared by the recipe scripts of Achievement 1 (Exercises 1.4, 1.5 and 1.6)
+#
+# The scripts used to build their ingredient catalog with
+#     if ingredient not in all_ingredients:
+#         all_ingredients.append(ingredient)
+# which scans the whole list for every ingredient, so building a catalog of
+# n ingredients takes about n * n / 2 comparisons. IngredientRegistry keeps
+# the list (for the numbered menus) plus a dictionary of the names, so adding
+# an ingredient or checking for one takes the same time however big the
+# catalog is.
+
+class IngredientRegistry:
+    """
+    An ordered set of ingredients with stable numeric ids.
+
+    Ingredients are compared without case and extra whitespace
+    ("Olive  oil" is the same as "olive oil"); the first spelling added is
+    the one kept for display. Ids are given in insertion order, from 0, and
+    never change, so they can be used as list positions.
+    """
+
+    def __init__(self, ingredients=()):
+        """
+        Create the registry, optionally with a first batch of ingredients.
+
+        Args:
+            ingredients (iterable): ingredient names to add
+        """
+        self._ids = {}      # normalized name -> id
+        self._names = []    # id -> name as first added
+        self.update(ingredients)
+
+    @staticmethod
+    def normalize(ingredient):
+        """
+        Return the form ingredients are compared in.
+
+        Args:
+            ingredient (str): ingredient name
+
+        Returns:
+            str: the name in lower case, with single spaces and no surrounding spaces
+        """
+        return ' '.join(ingredient.split()).casefold()
+
+    def add(self, ingredient):
+        """
+        Add an ingredient if it isn't registered yet.
+
+        Args:
+            ingredient (str): ingredient name
+
+        Returns:
+            int: the id of the ingredient
+        """
+        key = self.normalize(ingredient)
+        ingredient_id = self._ids.get(key)
+        if ingredient_id is None:
+            ingredient_id = len(self._names)
+            self._ids[key] = ingredient_id
+            self._names.append(' '.join(ingredient.split()))
+        return ingredient_id
+
+    def update(self, ingredients):
+        """
+        Add several ingredients.
+
+        Args:
+            ingredients (iterable): ingredient names
+        """
+        for ingredient in ingredients:
+            self.add(ingredient)
+
+    def id_of(self, ingredient):
+        """
+        Return the id of an ingredient, or None if it isn't registered.
+
+        Args:
+            ingredient (str): ingredient name
+        """
+        return self._ids.get(self.normalize(ingredient))
+
+    def __contains__(self, ingredient):
+        return self.normalize(ingredient) in self._ids
+
+    def __getitem__(self, ingredient_id):
+        """Return the ingredient with this id (a list position, so -1 is the last one)."""
+        return self._names[ingredient_id]
+
+    def __iter__(self):
+        """Iterate over the ingredients in the order they were added."""
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f'IngredientRegistry({self._names!r})'
@@ -0,0 +1,36 @@
+# books/cache.py
+# The rendered detail page is cached under the version of the book and its
+# ETag is derived from it. The version is Book.updated_at, read by primary key:
+# it lives in the database, so every worker process sees a change at once,
+# whichever process made it, and a page cached under an older version is
+# never served again.
+from django.utils import timezone
+
+from .models import Book
+
+# seconds a rendered detail page is kept
+DETAIL_CACHE_TIMEOUT = 60 * 60
+
+
+# define a function that returns the version of a book (None if there is no such book)
+def get_book_version(pk):
+    updated_at = Book.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return updated_at.strftime('%Y%m%d%H%M%S%f')
+
+
+# define a function that makes the cached pages of a book stale, for changes
+# that don't save the book (saving it sets updated_at already)
+def bump_book_version(pk):
+    bump_book_versions(Book.objects.filter(pk=pk))
+
+
+# define a function that does the same for a queryset of books, in one query
+def bump_book_versions(books):
+    books.update(updated_at=timezone.now())
+
+
+# define a function that returns the cache key of a book's rendered detail page
+def get_detail_cache_key(pk, version):
+    return f'books:detail:{int(pk)}:{version}'
@@ -0,0 +1,50 @@
+# books/management/commands/dedupe_media.py
+# Move the pictures uploaded before the content-addressed storage (bookstore/storage.py)
+# into it, so identical files are kept once.
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from books.models import Book
+from bookstore.images import schedule_derivatives
+from bookstore.storage import is_content_addressed
+from customers.models import Customer
+
+MODELS = (Book, Customer)
+
+
+class Command(BaseCommand):
+    help = 'Store the existing book and customer pictures by content hash'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the old files instead of deleting them')
+
+    def handle(self, *args, **options):
+        moved = 0
+        before = set()
+        after = set()
+        for model in MODELS:
+            field = model._meta.get_field('pic')
+            storage = field.storage
+            # the default picture is shared by name already, and new rows still use it
+            names = model.objects.exclude(pic__in=['', field.default]).values_list('pic', flat=True).distinct()
+            for name in list(names):
+                if is_content_addressed(name) or not storage.exists(name):
+                    continue
+                with storage.open(name, 'rb') as f:
+                    new_name = storage.save(name, f)
+                changes = {'pic': new_name}
+                if model is Book:
+                    # the cached detail pages show the old name (see books/cache.py)
+                    changes['updated_at'] = timezone.now()
+                # one UPDATE per distinct file, not per row
+                moved += model.objects.filter(pic=name).update(**changes)
+                before.add(name)
+                after.add(new_name)
+                schedule_derivatives(new_name)
+                if not options['keep']:
+                    storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} pictures: {len(before)} files stored as {len(after)}'
+        ))
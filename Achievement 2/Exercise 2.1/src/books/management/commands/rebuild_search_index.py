@@ -0,0 +1,14 @@
+# books/management/commands/rebuild_search_index.py
+# Re-index every book for the catalog search, e.g. after a bulk import.
+from django.core.management.base import BaseCommand
+
+from books.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalog search index of the books'
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        kind = 'FTS5 table' if fts_available() else 'in-memory index'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the {kind}'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_author_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='name',
+            field=models.CharField(db_index=True, max_length=120),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Full-text index of the books (see books/search.py)
+
+from django.db import migrations
+
+FTS_TABLE = 'books_book_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return      # books/search.py falls back to its in-memory index
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"name, author_name, genre, tokenize='unicode61')"
+            )
+        except Exception:
+            return  # SQLite without FTS5
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, author_name, genre) '
+            f'SELECT id, name, author_name, genre FROM books_book'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_alter_book_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
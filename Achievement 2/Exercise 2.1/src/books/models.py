@@ -1,3 +1,6 @@
+import threading
+from contextlib import contextmanager
+
 from django.db import models
 from django.shortcuts import reverse
 
@@ -17,16 +20,54 @@ book_type_choices = (
     ('audiobook', 'Audiobook')
 )
 
+# ids of the books being deleted by this thread
+_deleting = threading.local()
+
+
+def books_being_deleted():
+    """Ids of the books this thread is deleting (the receivers of their
+    cascaded sales use it to skip per-sale work, see sales/signals.py)."""
+    if not hasattr(_deleting, 'book_ids'):
+        _deleting.book_ids = set()
+    return _deleting.book_ids
+
+
+@contextmanager
+def deleting_books(book_ids):
+    # the ids are forgotten however the delete ends, even if it fails midway
+    ids = books_being_deleted()
+    added = set(book_ids) - ids
+    ids |= added
+    try:
+        yield
+    finally:
+        ids -= added
+
+
+class BookQuerySet(models.QuerySet):
+    def delete(self):
+        with deleting_books(self.values_list('pk', flat=True)):
+            return super().delete()
+
+
 class Book(models.Model):
-    name = models.CharField(max_length=120)
+    name = models.CharField(max_length=120, db_index=True)   # sales are looked up by book name
     author_name = models.CharField(max_length=120)
     price = models.FloatField(help_text='in US dollars $')
     genre = models.CharField(max_length=12, choices=genre_choices, default='cl')
     book_type = models.CharField(max_length=12, choices=book_type_choices, default='hc')
     pic = models.ImageField(upload_to='books', default='no_picture.jpg')
+    # version of the cached detail page (see books/cache.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
 
     def __str__(self):
         return str(self.name)
     
     def get_absolute_url(self):
-        return reverse('books:detail', kwargs={'pk': self.pk})
\ No newline at end of file
+        return reverse('books:detail', kwargs={'pk': self.pk})
+
+    def delete(self, *args, **kwargs):
+        with deleting_books([self.pk]):
+            return super().delete(*args, **kwargs)
@@ -0,0 +1,76 @@
+# books/pagination.py
+# Keyset (seek) pagination: a page is found by the (name, id) of the book it
+# starts after, not by an OFFSET, so page 5,000 costs the same as page 1.
+import base64
+import binascii
+import json
+
+from django.http import Http404
+
+
+# define a function that turns a position in the list into an opaque URL value
+def encode_cursor(book, direction):
+    data = json.dumps([book.name, book.pk, direction]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+# define a function that reads a cursor back, raising Http404 for a broken one
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, pk, direction = json.loads(data)
+        if not isinstance(name, str) or not isinstance(pk, int) or direction not in ('next', 'prev'):
+            raise ValueError
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise Http404('invalid cursor')
+    return name, pk, direction
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+# define a function that returns the books after (or before) a cursor position, in reading order
+def seek(qs, name, pk, direction):
+    # "name >= ?" is what lets the name index seek to the position; an OR of
+    # both columns (name > ? OR name = ? AND id > ?) makes SQLite scan it
+    if direction == 'next':
+        return qs.filter(name__gte=name).exclude(name=name, id__lte=pk).order_by('name', 'id')
+    # read backwards from the position
+    return qs.filter(name__lte=name).exclude(name=name, id__gte=pk).order_by('-name', '-id')
+
+
+# qs: queryset of books, cursor: value from the URL (or None for the first page)
+def keyset_paginate(qs, cursor, page_size):
+    if not cursor:
+        rows = list(qs.order_by('name', 'id')[:page_size + 1])
+        more, came_from = len(rows) > page_size, False
+        rows = rows[:page_size]
+        direction = 'next'
+    else:
+        name, pk, direction = decode_cursor(cursor)
+        rows = list(seek(qs, name, pk, direction)[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == 'prev':
+            # the books before the cursor were read backwards, put them back in order
+            rows = rows[::-1]
+        came_from = True
+
+    if direction == 'next':
+        has_next, has_previous = more, came_from
+    else:
+        has_next, has_previous = came_from, more
+
+    next_cursor = encode_cursor(rows[-1], 'next') if rows and has_next else None
+    previous_cursor = encode_cursor(rows[0], 'prev') if rows and has_previous else None
+    return KeysetPage(rows, next_cursor, previous_cursor)
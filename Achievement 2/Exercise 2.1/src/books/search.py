@@ -0,0 +1,257 @@
+# books/search.py
+# Catalog search over the name, author_name and genre of the books.
+#
+# On SQLite the books are indexed in an FTS5 virtual table (books_book_fts,
+# created by migration 0006) and ranked with bm25. Elsewhere, or when SQLite
+# was built without FTS5, an inverted index kept in process memory is used.
+# Both are kept in sync by the signals in books/signals.py.
+#
+# The in-memory index of each process only sees the changes of that process,
+# so every change also bumps a version in the default cache: a process whose
+# index is at an older version (another process changed the books) builds it
+# again before searching. This needs a cache shared by the processes (see
+# BOOKSTORE_CACHE_DIR in settings.py).
+import re
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from threading import Lock
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Book
+
+FTS_TABLE = 'books_book_fts'
+
+# weight of a match in each field, most relevant first
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'author_name': 2.0,
+    'genre': 1.0,
+}
+
+_fts_available = None
+
+# cache key of the version of the books, for the in-memory index
+SEARCH_VERSION_KEY = 'books:search-version'
+
+
+# define a function that splits text into lower-case words
+def tokenize(text):
+    return re.findall(r'\w+', str(text or '').lower())
+
+
+# define a function that tells whether the FTS5 table exists in the database
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+# define a function that returns the shared version of the books
+def get_search_version():
+    # start from the clock, so a version that was evicted never comes back
+    # with a number an index was built at
+    started = time.time_ns()
+    if cache.add(SEARCH_VERSION_KEY, started, timeout=None):
+        return started
+    version = cache.get(SEARCH_VERSION_KEY)
+    return started if version is None else version
+
+
+# define a function that moves the shared version on, returning the new one
+def bump_search_version():
+    try:
+        return cache.incr(SEARCH_VERSION_KEY)
+    except ValueError:
+        # evicted: start again from the clock
+        return get_search_version()
+
+
+class InvertedIndex:
+    """
+    Word -> book ids, per field, with the words kept sorted for prefix lookups.
+    Built from the database on first use, and again when the shared version
+    says another process changed the books.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.build_lock = Lock()    # one build at a time
+        self.version = None         # shared version the index is at (None: not built)
+        self.pending = None         # changes made during a build, replayed after it
+        self.postings = defaultdict(lambda: defaultdict(set))   # word -> field -> ids
+        self.words = []                                         # sorted words
+        self.documents = {}                                     # id -> words of the book
+
+    def build(self):
+        with self.build_lock:
+            # read first: a change made during the build moves the version on
+            version = get_search_version()
+            with self.lock:
+                self.pending = []
+            # the books are read without holding the lock, into a new index
+            fresh = InvertedIndex()
+            try:
+                for book in Book.objects.only(*FIELD_WEIGHTS).iterator(chunk_size=2000):
+                    fresh._add(book, keep_sorted=False)
+            except BaseException:
+                with self.lock:
+                    self.pending = None
+                raise
+            # sorted once, not word by word
+            fresh.words = sorted(fresh.postings)
+
+            with self.lock:
+                self.postings, self.words, self.documents = fresh.postings, fresh.words, fresh.documents
+                # the changes that came during the build may be missing from what was read
+                for pk, book, change_version in self.pending:
+                    self._apply(pk, book)
+                    if change_version == version + 1:
+                        version = change_version
+                self.pending = None
+                self.version = version
+
+    def _add(self, book, keep_sorted=True):
+        words = set()
+        for field in FIELD_WEIGHTS:
+            for word in tokenize(getattr(book, field)):
+                if keep_sorted and word not in self.postings:
+                    insort(self.words, word)
+                self.postings[word][field].add(book.pk)
+                words.add((word, field))
+        self.documents[book.pk] = words
+
+    def _remove(self, pk):
+        for word, field in self.documents.pop(pk, ()):
+            ids = self.postings[word][field]
+            ids.discard(pk)
+            if not ids:
+                del self.postings[word][field]
+            if not self.postings[word]:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    def _apply(self, pk, book):
+        self._remove(pk)
+        if book is not None:
+            self._add(book)
+
+    def _change(self, pk, book):
+        # book: the book as saved, None when it was deleted
+        version = bump_search_version()
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((pk, book, version))    # replayed by build()
+                return
+            if self.version is None:
+                return      # built with the change on first use
+            self._apply(pk, book)
+            if version == self.version + 1:
+                # no other process changed the books meanwhile
+                self.version = version
+
+    def update(self, book):
+        self._change(book.pk, book)
+
+    def delete(self, pk):
+        self._change(pk, None)
+
+    def search(self, terms, limit):
+        if self.version != get_search_version():
+            self.build()
+        with self.lock:
+            scores = None
+            for term in terms:
+                # every word starting with the term
+                term_scores = defaultdict(float)
+                start = bisect_left(self.words, term)
+                for word in self.words[start:]:
+                    if not word.startswith(term):
+                        break
+                    for field, ids in self.postings[word].items():
+                        for pk in ids:
+                            term_scores[pk] += FIELD_WEIGHTS[field]
+                # a book must match every term
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [pk for pk, _ in ranked[:limit]]
+
+
+fallback_index = InvertedIndex()
+
+
+# define a function that adds or refreshes a book in the search index
+def index_book(book):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, author_name, genre) VALUES (%s, %s, %s, %s)',
+                [book.pk, book.name, book.author_name, book.genre],
+            )
+    else:
+        fallback_index.update(book)
+
+
+# define a function that removes a book from the search index
+def unindex_book(pk):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+    else:
+        fallback_index.delete(pk)
+
+
+# define a function that rebuilds the whole index (e.g. after bulk_create,
+# which sends no signals)
+def rebuild_index():
+    if not fts_available():
+        # the other processes build theirs again too
+        bump_search_version()
+        fallback_index.build()
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, author_name, genre) '
+            f'SELECT id, name, author_name, genre FROM books_book'
+        )
+
+
+# define a function that returns the ids of the books matching every word of
+# the query (as a prefix), most relevant first
+def search_book_ids(query, limit=20):
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    if not fts_available():
+        return fallback_index.search(terms, limit)
+
+    # "word"* is a prefix query; quoting keeps FTS5 syntax out of user input
+    match = ' '.join(f'"{term}"*' for term in terms)
+    weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+# define a function that returns the matching books, most relevant first
+def search_books(query, limit=20):
+    ids = search_book_ids(query, limit)
+    books = Book.objects.in_bulk(ids)
+    return [books[pk] for pk in ids if pk in books]
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from bookstore.images import derivatives_ready, picture_saved, picture_saving
+from .cache import bump_book_versions
+from .models import Book
+from .search import index_book, unindex_book
+
+
+# keep the catalog search index in line with the books
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    index_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    unindex_book(instance.pk)
+
+
+# thumbnails of the picture, made in the background when it changes
+pre_save.connect(picture_saving, sender=Book, dispatch_uid='books.picture_saving')
+post_save.connect(picture_saved, sender=Book, dispatch_uid='books.picture_saved')
+
+
+# the cached detail pages of the books showing a picture get its new thumbnails
+@receiver(derivatives_ready)
+def book_derivatives_ready(sender, name, **kwargs):
+    bump_book_versions(Book.objects.filter(pic=name))
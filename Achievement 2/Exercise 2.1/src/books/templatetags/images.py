@@ -0,0 +1,37 @@
+# books/templatetags/images.py
+# Responsive pictures from the thumbnails of bookstore/images.py
+#
+#   {% load images %}
+#   {% picture object.pic width=150 height=200 %}
+from django import template
+from django.utils.html import format_html
+
+from bookstore.images import available_derivatives
+
+register = template.Library()
+
+
+# srcset value of the thumbnails of a picture ("" when there are none yet)
+@register.simple_tag
+def srcset(pic, fmt=None):
+    derivatives = available_derivatives(pic.name)
+    index = 2 if fmt == 'webp' else 1
+    return ', '.join(f'{d[index]} {d[0]}w' for d in derivatives)
+
+
+# <picture> with a WebP source and the thumbnails, falling back to the original
+@register.simple_tag
+def picture(pic, width, height, alt=''):
+    derivatives = available_derivatives(pic.name)
+    if not derivatives:
+        return format_html('<img src="{}" width="{}" height="{}" alt="{}">', pic.url, width, height, alt)
+
+    # the smallest thumbnail at least as wide as the picture is shown
+    src = next((d[1] for d in derivatives if d[0] >= width), derivatives[-1][1])
+    sizes = f'{width}px'
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy"></picture>',
+        ', '.join(f'{d[2]} {d[0]}w' for d in derivatives), sizes,
+        src, ', '.join(f'{d[1]} {d[0]}w' for d in derivatives), sizes, width, height, alt,
+    )
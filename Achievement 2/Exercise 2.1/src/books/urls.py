@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import BookListView, BookDetailView
+from .views import BookListView, BookDetailView, BookSearchView
 
 app_name = 'books'
 
 urlpatterns = [
     path('list/', BookListView.as_view(), name='list'),
-    path('list/<pk>', BookDetailView.as_view(), name='detail'),
+    path('list/<int:pk>', BookDetailView.as_view(), name='detail'),
+    path('search/', BookSearchView.as_view(), name='search'),
 ]
@@ -1,6 +1,12 @@
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.generic import ListView, DetailView
+from .cache import DETAIL_CACHE_TIMEOUT, get_book_version, get_detail_cache_key
 from .models import Book
+from .pagination import keyset_paginate
+from .search import search_books
 # to protect class-based view
 from django.contrib.auth.mixins import LoginRequiredMixin
 
@@ -9,7 +15,58 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 class BookListView(LoginRequiredMixin, ListView):  # class-based "protected" view
     model = Book
     template_name = 'books/main.html'
+    page_size = 50  # books per page
+
+    def get_queryset(self):
+        # only the columns books/main.html shows, one page found by its cursor
+        qs = Book.objects.only('id', 'name', 'pic')
+        self.page = keyset_paginate(qs, self.request.GET.get('cursor'), self.page_size)
+        return self.page.object_list
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page'] = self.page
+        return context
 
 class BookDetailView(LoginRequiredMixin, DetailView):  # class-based "protected" view
     model = Book
     template_name = 'books/detail.html'
+
+    def get(self, request, *args, **kwargs):
+        # the version of the book decides the ETag and the cached page,
+        # so a repeat or popular view only reads the version of the book
+        pk = int(self.kwargs['pk'])
+        version = get_book_version(pk)
+        if version is None:
+            raise Http404('no such book')
+        etag = f'"book-{pk}-{version}"'
+
+        # the client already has this version
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = get_detail_cache_key(pk, version)
+            content = cache.get(key)
+            if content is None:
+                rendered = super().get(request, *args, **kwargs)
+                content = rendered.render().content
+                cache.set(key, content, DETAIL_CACHE_TIMEOUT)
+            response = HttpResponse(content)
+
+        response['ETag'] = etag
+        # always revalidate, which is cheap thanks to the ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class BookSearchView(LoginRequiredMixin, ListView):  # class-based "protected" view
+    template_name = 'books/search.html'
+    limit = 50  # results shown
+
+    def get_queryset(self):
+        # books matching every word of ?q= (as prefixes), most relevant first
+        return search_books(self.request.GET.get('q', ''), self.limit)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
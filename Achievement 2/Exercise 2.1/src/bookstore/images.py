@@ -0,0 +1,156 @@
+"""
+Image derivatives for the uploaded pictures (Book.pic, Customer.pic).
+
+Every picture gets width-bounded thumbnails in its own format and in WebP,
+stored next to the original under MEDIA_ROOT:
+
+    books/emma.jpg -> books/emma.w150.jpg, books/emma.w150.webp, ...
+
+They are generated with Pillow in a background thread pool when a picture is
+saved with a new picture (see the signals of the books and customers apps) and
+used in templates through the tags in books/templatetags/images.py. Once they
+are written, derivatives_ready is sent, so cached pages showing the picture
+are rendered again.
+"""
+
+import logging
+import posixpath
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.dispatch import Signal
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# widths (in pixels) of the thumbnails; wider than the original are skipped
+THUMBNAIL_WIDTHS = (150, 300, 600)
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+
+# sent with the name of a picture once thumbnails of it were written, so the
+# cached pages showing the picture can be refreshed (see books/signals.py)
+derivatives_ready = Signal()
+
+
+# "<original root>.w<width>.<ext>" as made by derivative_name
+DERIVATIVE_RE = re.compile(r'\.w\d+\.[^./]+$')
+
+
+def derivative_name(name, width, fmt=None):
+    """Name of the ``width`` thumbnail of ``name``; ``fmt='webp'`` for the WebP one."""
+    root, ext = posixpath.splitext(name)
+    return f'{root}.w{width}{"." + fmt if fmt else ext}'
+
+
+def is_derivative(name):
+    """True if ``name`` is the name of a thumbnail."""
+    return bool(name) and DERIVATIVE_RE.search(name) is not None
+
+
+def generate_derivatives(name, storage=default_storage):
+    """Write the missing thumbnails of the picture ``name``; return their names."""
+    missing = {
+        (width, fmt) for width in THUMBNAIL_WIDTHS for fmt in (None, 'webp')
+        if not storage.exists(derivative_name(name, width, fmt))
+    }
+    if not missing:
+        return []
+
+    # the content-addressed storage only keeps thumbnail names given this way
+    save = getattr(storage, 'save_derivative', storage.save)
+    created = []
+    with storage.open(name, 'rb') as f:
+        # only the header is read here; the pixels are decoded by the first resize
+        original = Image.open(f)
+        for width in THUMBNAIL_WIDTHS:
+            if width >= original.width:
+                break
+            height = round(original.height * width / original.width)
+            thumbnail = None
+            for fmt in (None, 'webp'):
+                if (width, fmt) not in missing:
+                    continue
+                if thumbnail is None:
+                    thumbnail = original.resize((width, height), Image.Resampling.LANCZOS)
+                content = ContentFile(_encode(thumbnail, fmt or original.format))
+                created.append(save(derivative_name(name, width, fmt), content))
+    return created
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    fmt = fmt.upper()
+    if fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif fmt in ('JPEG', 'JPG'):
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, fmt, optimize=True)
+    return buffer.getvalue()
+
+
+def _generate_logged(name):
+    try:
+        created = generate_derivatives(name)
+    except Exception:
+        logger.exception('could not generate the derivatives of %s', name)
+        return []
+    if created:
+        derivatives_ready.send(sender=None, name=name)
+    return created
+
+
+def _generate_in_background(name):
+    try:
+        return _generate_logged(name)
+    finally:
+        # the derivatives_ready receivers open a connection in this worker thread
+        connections.close_all()
+
+
+def schedule_derivatives(name):
+    """
+    Generate the derivatives of ``name`` in the background (or right away when
+    IMAGE_DERIVATIVES_ASYNC is False). Returns a Future, or the created names.
+    """
+    # the default picture may not be on disk (e.g. in a fresh checkout)
+    if not name or not default_storage.exists(name):
+        return None
+    if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        return _executor.submit(_generate_in_background, name)
+    return _generate_logged(name)
+
+
+def picture_saving(sender, instance, **kwargs):
+    """pre_save receiver for models with a ``pic`` ImageField: remember the picture before the save."""
+    instance._previous_pic = None
+    if instance.pk is not None:
+        instance._previous_pic = sender.objects.filter(pk=instance.pk).values_list('pic', flat=True).first()
+
+
+def picture_saved(sender, instance, created, **kwargs):
+    """post_save receiver for models with a ``pic`` ImageField."""
+    # the thumbnails of an unchanged picture are there already
+    if created or instance.pic.name != getattr(instance, '_previous_pic', None):
+        schedule_derivatives(instance.pic.name)
+
+
+def available_derivatives(name, storage=default_storage):
+    """(width, url, webp url) of the thumbnails of ``name`` that were generated."""
+    found = []
+    for width in THUMBNAIL_WIDTHS:
+        webp = derivative_name(name, width, 'webp')
+        # written after the other format, so it tells that both are there
+        if not storage.exists(webp):
+            break
+        found.append((width, storage.url(derivative_name(name, width)), storage.url(webp)))
+    return found
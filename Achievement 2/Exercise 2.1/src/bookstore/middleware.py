@@ -0,0 +1,73 @@
+"""
+Middleware of the bookstore project.
+"""
+
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import profiling, staticfiles
+
+
+class ProfilingMiddleware:
+    """
+    Profile every request when BOOKSTORE_PROFILING is enabled.
+
+    The timings are sent back in a Server-Timing header and aggregated in
+    process; staff users can read the percentiles at /stats/.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'BOOKSTORE_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile, token = profiling.start_profile()
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profiling.query_timer))
+                response = self.get_response(request)
+        finally:
+            profiling.stop_profile(token)
+        profile['total'] = perf_counter() - start
+
+        match = request.resolver_match
+        profiling.record(match.view_name if match else 'unresolved', profile)
+        response['Server-Timing'] = self.server_timing(profile)
+        return response
+
+    def server_timing(self, profile):
+        metrics = [
+            f"total;dur={profile['total'] * 1000:.1f}",
+            f"db;dur={profile['db'] * 1000:.1f};desc=\"{profile['queries']} queries\"",
+        ]
+        for name in ('template', 'chart'):
+            if name in profile:
+                metrics.append(f'{name};dur={profile[name] * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the static and media files when BOOKSTORE_SERVE_FILES is enabled,
+    so a small deployment needs no separate file server (see bookstore/staticfiles.py).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'BOOKSTORE_SERVE_FILES', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.roots = staticfiles.file_roots()
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD'):
+            found = staticfiles.find_file(request.path_info, self.roots)
+            if found is not None:
+                return staticfiles.serve_file(request, *found)
+        return self.get_response(request)
@@ -0,0 +1,120 @@
+"""
+Request profiling for the bookstore project.
+
+Collects, per request, the wall time, the number and total time of the SQL
+queries, the template render time and the chart render time. Enabled with
+BOOKSTORE_PROFILING = True, see bookstore.middleware.ProfilingMiddleware.
+"""
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# requests kept per view for the percentiles
+STATS_WINDOW = 1000
+
+# timings of the request being handled, None when it is not profiled
+_current = ContextVar('bookstore_profile', default=None)
+
+# view name -> timings of its last STATS_WINDOW requests
+_stats = defaultdict(lambda: deque(maxlen=STATS_WINDOW))
+_stats_lock = Lock()
+
+
+def start_profile():
+    """Start collecting timings for the current request and return them."""
+    profile = {'queries': 0, 'db': 0.0}
+    return profile, _current.set(profile)
+
+
+def stop_profile(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to ``name`` of the current profile."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        profile[name] = profile.get(name, 0.0) + perf_counter() - start
+
+
+def query_timer(execute, sql, params, many, context):
+    """Database execute wrapper counting the queries and their time."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile['queries'] += 1
+        profile['db'] += perf_counter() - start
+
+
+def record(view_name, profile):
+    with _stats_lock:
+        _stats[view_name].append(dict(profile))
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _percentile(values, percent):
+    # nearest-rank percentile of a sorted list
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def get_stats():
+    """Return p50/p95/p99 of every metric, per view."""
+    with _stats_lock:
+        snapshot = {view: list(profiles) for view, profiles in _stats.items()}
+
+    stats = {}
+    for view, profiles in snapshot.items():
+        metrics = defaultdict(list)
+        for profile in profiles:
+            for name, value in profile.items():
+                metrics[name].append(value)
+        stats[view] = {'requests': len(profiles)}
+        for name, values in metrics.items():
+            values.sort()
+            scale = 1 if name == 'queries' else 1000    # times in ms
+            stats[view][name] = {
+                f'p{percent}': round(_percentile(values, percent) * scale, 3)
+                for percent in (50, 95, 99)
+            }
+    return stats
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every template it renders."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
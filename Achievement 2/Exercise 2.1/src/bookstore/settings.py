@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,7 +46,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it times everything below; inactive unless BOOKSTORE_PROFILING
+    'bookstore.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # static and media files, before sessions etc.; inactive unless BOOKSTORE_SERVE_FILES
+    'bookstore.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,7 +63,7 @@ ROOT_URLCONF = 'bookstore.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'bookstore.profiling.ProfiledDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [BASE_DIR / 'templates'],  # Project-level templates
         'APP_DIRS': True,  # Enable app-level templates
         'OPTIONS': {
@@ -77,13 +82,114 @@ WSGI_APPLICATION = 'bookstore.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuning, run on every new connection (init_command below);
+# with WAL, readers go on while a writer (e.g. import_sales) commits
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # durable at checkpoints only, which is safe with WAL and much faster
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # negative: in KiB, so 64 MB of page cache per connection
+    'cache_size': -64000,
+    # milliseconds a connection waits for a lock before "database is locked"
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    # writers take the lock when the transaction begins, so they queue on
+    # busy_timeout instead of failing when a read lock can't be upgraded
+    'transaction_mode': 'IMMEDIATE',
+}
+
+# seconds a connection is reused across requests (0: one per request)
+CONN_MAX_AGE = int(os.environ.get('BOOKSTORE_CONN_MAX_AGE', '600'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# read-only database for the analytics queries (charts and the CSV export):
+# a replica of db.sqlite3 kept up to date outside Django, or db.sqlite3 itself
+if os.environ.get('BOOKSTORE_ANALYTICS_DB'):
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{os.environ['BOOKSTORE_ANALYTICS_DB']}?mode=ro",
+        'OPTIONS': {
+            'uri': True,
+            # journal_mode is a property of the file, set by the writers
+            'init_command': ';'.join(
+                f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items() if name != 'journal_mode'
+            ),
+        },
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# alias the analytics queries are sent to
+SALES_ANALYTICS_DB = 'analytics' if 'analytics' in DATABASES else 'default'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Rendered sales charts get their own size-bounded cache. It lives in memory by
+# default; set BOOKSTORE_CHART_CACHE_DIR to share it between processes on disk.
+# The book detail pages are cached in 'default' under the version stored in
+# Book.updated_at, so each process may keep its own copy safely. 'default' also
+# holds the version of the in-memory search index (books/search.py, used when
+# SQLite has no FTS5), which the processes must share to see each other's
+# changes: set BOOKSTORE_CACHE_DIR to keep 'default' on disk.
+
+CHART_CACHE_TIMEOUT = 60 * 15   # seconds a rendered chart is kept
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'charts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sales-charts',
+        'TIMEOUT': CHART_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': 500,
+        },
+    },
+}
+
+if os.environ.get('BOOKSTORE_CACHE_DIR'):
+    CACHES['default'].update({
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['BOOKSTORE_CACHE_DIR'],
+    })
+
+if os.environ.get('BOOKSTORE_CHART_CACHE_DIR'):
+    CACHES['charts'].update({
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['BOOKSTORE_CHART_CACHE_DIR'],
+    })
+
+
+# Profiling
+# Per-request timings (Server-Timing header and /stats/ for staff users).
+
+BOOKSTORE_PROFILING = os.environ.get('BOOKSTORE_PROFILING', 'false').lower() == 'true'
+
+
+# Sales chart workers
+# Number of background processes rendering the charts of the records page.
+# 0 renders each chart inline, when its image is requested.
+
+SALES_CHART_WORKERS = int(os.environ.get('BOOKSTORE_CHART_WORKERS', '0'))
+SALES_CHART_WAIT = 30           # seconds the image waits for a worker
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,9 +232,36 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# where collectstatic puts the files served in production
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# serve static and media files from Django (bookstore/staticfiles.py) instead of a file server
+BOOKSTORE_SERVE_FILES = os.environ.get('BOOKSTORE_SERVE_FILES', 'false').lower() == 'true'
+
+# seconds browsers keep the static and media files that aren't hashed
+STATIC_MAX_AGE = 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT= BASE_DIR / 'media'
 
+# uploads are stored once per content hash (bookstore/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'bookstore.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# hashed and precompressed copies when the files are served by the project;
+# these need collectstatic to be run first
+if BOOKSTORE_SERVE_FILES:
+    STORAGES['staticfiles']['BACKEND'] = 'bookstore.staticfiles.CompressedManifestStaticFilesStorage'
+
+# thumbnails of uploaded pictures are made in a background thread (bookstore/images.py)
+IMAGE_DERIVATIVES_ASYNC = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,7 +272,7 @@ LOGIN_URL = '/login/'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'bookstore.profiling.ProfiledDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
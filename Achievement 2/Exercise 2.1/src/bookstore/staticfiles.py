@@ -0,0 +1,251 @@
+"""
+Serving static and media files from the bookstore itself.
+
+When BOOKSTORE_SERVE_FILES is on, StaticFilesMiddleware (bookstore/middleware.py)
+answers the requests under STATIC_URL (from STATIC_ROOT, then STATICFILES_DIRS)
+and MEDIA_URL (from MEDIA_ROOT) before they reach the URL resolver:
+
+* ``collectstatic`` stores hashed copies of the static files, plus ``.gz`` and
+  ``.br`` (when the brotli package is installed) variants of the compressible
+  ones (CompressedManifestStaticFilesStorage); the variant matching the
+  Accept-Encoding of the request is sent as is, without compressing anything
+  per request;
+* hashed static files and content-addressed media (bookstore/storage.py) never
+  change, so they are cached for a year as immutable, the others for
+  STATIC_MAX_AGE seconds;
+* ETag/Last-Modified conditional requests and single byte ranges are honoured.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .storage import is_content_addressed
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are made without it
+    brotli = None
+
+# a hashed or content-addressed file never changes, so browsers may keep it for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# extensions that are compressed already (or too small to gain anything)
+INCOMPRESSIBLE = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.ico', '.woff', '.woff2',
+    '.gz', '.br', '.zip', '.mp3', '.mp4', '.webm', '.pdf',
+}
+MIN_COMPRESS_SIZE = 256
+
+# (Accept-Encoding token, file suffix), best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# "name.0123456789ab.css" as written by ManifestStaticFilesStorage
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+# a single "bytes=first-last" range (either end may be left out)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$', re.IGNORECASE)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def compress_file(path):
+    """Write the .gz (and .br) variants of ``path``; return the written paths."""
+    if os.path.splitext(path)[1].lower() in INCOMPRESSIBLE:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+
+    written = []
+    for suffix, compressed in variants:
+        # not worth a variant if it saves less than 5%
+        if len(compressed) >= len(data) * 0.95:
+            continue
+        with open(path + suffix, 'wb') as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses what it collects."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = set()
+        for name, hashed_name, was_processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(was_processed, Exception):
+                processed.update(n for n in (name, hashed_name) if n)
+            yield name, hashed_name, was_processed
+        if dry_run:
+            return
+        for name in sorted(processed):
+            compress_file(self.path(name))
+
+
+def file_roots():
+    """(URL prefix, directories) pairs of the files to serve."""
+    static_dirs = [settings.STATIC_ROOT] if settings.STATIC_ROOT else []
+    for entry in settings.STATICFILES_DIRS:
+        # entries may be "(prefix, path)" pairs; those are left to collectstatic
+        if isinstance(entry, (str, os.PathLike)):
+            static_dirs.append(entry)
+    roots = []
+    if settings.STATIC_URL:
+        roots.append(('/' + settings.STATIC_URL.lstrip('/'), static_dirs))
+    if settings.MEDIA_URL and settings.MEDIA_ROOT:
+        roots.append(('/' + settings.MEDIA_URL.lstrip('/'), [settings.MEDIA_ROOT]))
+    return [(prefix if prefix.endswith('/') else prefix + '/', [str(d) for d in dirs]) for prefix, dirs in roots]
+
+
+def find_file(path, roots):
+    """(absolute path, name under the root) of the file for URL ``path``, or None."""
+    for prefix, dirs in roots:
+        if not path.startswith(prefix):
+            continue
+        name = unquote(path[len(prefix):])
+        for directory in dirs:
+            try:
+                full_path = safe_join(directory, name)
+            except SuspiciousFileOperation:
+                return None
+            if os.path.isfile(full_path):
+                return full_path, name
+    return None
+
+
+def is_immutable(name):
+    return HASHED_NAME_RE.search(name) is not None or is_content_addressed(name)
+
+
+def accepted_encodings(request):
+    tokens = request.headers.get('Accept-Encoding', '').split(',')
+    accepted = set()
+    for token in tokens:
+        encoding, _, params = token.strip().partition(';')
+        # "gzip;q=0" refuses gzip
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive; None to ignore the header
+    (bad syntax or several ranges); ValueError if it can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # "bytes=-500": the last 500 bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError('range not satisfiable')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError('range not satisfiable')
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, name):
+    """Response for the file at ``path`` (``name`` under its root)."""
+    # a precompressed variant, if the client takes it
+    encoding = None
+    variants = False
+    accepted = accepted_encodings(request)
+    for token, suffix in ENCODINGS:
+        if os.path.isfile(path + suffix):
+            variants = True
+            if encoding is None and token in accepted:
+                encoding = token
+                chosen = path + suffix
+    if encoding is None:
+        chosen = path
+    path = chosen
+
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, path, stat.st_size, etag, encoding, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if variants:
+        response['Vary'] = 'Accept-Encoding'
+    if is_immutable(name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE)
+    return response
+
+
+def _file_response(request, path, size, etag, encoding, content_type):
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    # ranges are given in bytes of the identity encoding only
+    if range_header and not encoding and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status, content_type=content_type)
+    elif status == 206:
+        response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        # FileResponse names the download after the variant (e.g. "site.css.gz")
+        del response['Content-Disposition']
+
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,94 @@
+"""
+Content-addressed storage for the uploaded pictures (Book.pic, Customer.pic).
+
+An upload is stored under the SHA-256 of its bytes instead of its own name:
+
+    books/emma.jpg -> 3f/3f9a...c2.jpg
+
+so identical pictures (uploaded for several books or customers) share one
+file, and a name never points to other bytes, which lets media be cached
+forever (see media_view in bookstore/views.py).
+
+The thumbnails of bookstore/images.py are saved next to their original
+(3f/3f9a...c2.w150.webp, or no_picture.w150.webp for the default picture) so
+they can be found from its name: save() keeps the names of the thumbnails of
+content-addressed pictures, and save_derivative() is how generate_derivatives
+writes the others. Any other name is hashed, and no file is ever overwritten,
+so an upload named like a thumbnail (cover.w300.jpg) cannot replace one.
+"""
+
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from .images import is_derivative
+
+# "<2 hex>/<64 hex>" at the start of a name
+CONTENT_ADDRESSED_RE = re.compile(r'^([0-9a-f]{2})/\1[0-9a-f]{62}(?:\.|$)')
+
+
+def is_content_addressed(name):
+    """True if ``name`` is (or is derived from) a content-addressed file."""
+    return bool(name) and CONTENT_ADDRESSED_RE.match(name) is not None
+
+
+def content_hash(content):
+    """SHA-256 hex digest of a File, read in chunks."""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def content_name(name, content):
+    """Content-addressed name of ``content``, keeping the extension of ``name``."""
+    digest = content_hash(content)
+    ext = posixpath.splitext(name)[1].lower()
+    return f'{digest[:2]}/{digest}{ext}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names uploads by content hash and stores each once."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        if is_content_addressed(name) and is_derivative(name):
+            # a thumbnail of a stored picture keeps its name, or gets a free
+            # one if it is taken: its bytes may differ from the file there
+            return super().save(name, content, max_length=max_length)
+
+        # anything else, even an upload that looks content-addressed, is named
+        # by its own bytes
+        name = content_name(name, content)
+        # an identical picture was uploaded before
+        if self.exists(name):
+            return name
+        return self._save_once(name, content, max_length)
+
+    def save_derivative(self, name, content, max_length=None):
+        """Save the thumbnail ``name`` (see bookstore/images.py) under its own name."""
+        if not is_derivative(name):
+            raise ValueError(f"'{name}' is not the name of a thumbnail")
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self._save_once(name, content, max_length)
+
+    def _save_once(self, name, content, max_length):
+        saved = super().save(name, content, max_length=max_length)
+        if saved != name:
+            # the same bytes were written meanwhile (another upload of the
+            # picture, or another thread making the thumbnail): keep those
+            self.delete(saved)
+        return name
+
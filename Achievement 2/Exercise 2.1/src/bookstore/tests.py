@@ -0,0 +1,219 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from books.models import Book
+from books.tests import make_picture
+from customers.models import Customer
+from sales.models import Sale
+from . import profiling
+from .images import available_derivatives, generate_derivatives
+from .storage import ContentAddressedStorage, is_content_addressed
+from .views import media_view
+
+
+@override_settings(BOOKSTORE_PROFILING=True)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='tester', password='secret-pass-123')
+        cls.staff = get_user_model().objects.create_user(username='staff', password='secret-pass-123', is_staff=True)
+        book = Book.objects.create(name='Emma', author_name='Jane Austen', price=12.5)
+        Sale.objects.create(book=book, quantity=3, price=37.5)
+
+    def setUp(self):
+        profiling.reset_stats()
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sales:records'), {'book_title': 'Emma', 'chart_type': '#1'})
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('template;dur=', timing)
+
+    def test_chart_time_is_measured(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sales:chart'), {'book_title': 'Emma', 'chart_type': '#2'})
+        self.assertIn('chart;dur=', response['Server-Timing'])
+
+    def test_stats_percentiles(self):
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.get(reverse('sales:records'))
+
+        self.client.force_login(self.staff)
+        stats = self.client.get(reverse('stats')).json()
+        self.assertEqual(stats['sales:records']['requests'], 3)
+        self.assertIn('p95', stats['sales:records']['total'])
+        # login_required reads the session and the user from the database
+        self.assertEqual(stats['sales:records']['queries']['p50'], 2)
+
+    def test_stats_are_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('stats'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ProfilingDisabledTest(TestCase):
+    def test_no_header_by_default(self):
+        response = self.client.get(reverse('sales:home'))
+        self.assertNotIn('Server-Timing', response)
+
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = ContentAddressedStorage(location=media_root)
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.storage.save('books/emma.JPG', ContentFile(b'same bytes'))
+        second = self.storage.save('customers/anne.jpg', ContentFile(b'same bytes'))
+        other = self.storage.save('books/emma.jpg', ContentFile(b'other bytes'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(len(self.storage.listdir(first.split('/')[0])[1]), 1)
+
+    def test_derived_names_are_kept(self):
+        original = self.storage.save('emma.jpg', ContentFile(b'picture'))
+        thumbnail = original.replace('.jpg', '.w150.webp')
+        self.assertEqual(self.storage.save(thumbnail, ContentFile(b'thumbnail')), thumbnail)
+        self.assertTrue(is_content_addressed(thumbnail))
+        self.assertFalse(is_content_addressed('books/emma.jpg'))
+
+    def test_uploads_named_like_thumbnails_are_hashed(self):
+        first = self.storage.save('books/cover.w300.jpg', ContentFile(b'first user picture'))
+        second = self.storage.save('books/cover.w300.jpg', ContentFile(b'second user picture'))
+        self.assertNotEqual(first, second)
+        with self.storage.open(first) as f:
+            self.assertEqual(f.read(), b'first user picture')
+        # nor can a thumbnail name of a stored picture replace the thumbnail
+        thumbnail = first.replace('.jpg', '.w150.jpg')
+        self.storage.save_derivative(thumbnail, ContentFile(b'thumbnail'))
+        other = self.storage.save(thumbnail, ContentFile(b'other bytes'))
+        self.assertNotEqual(other, thumbnail)
+        with self.storage.open(thumbnail) as f:
+            self.assertEqual(f.read(), b'thumbnail')
+
+    def test_thumbnails_of_other_names_are_kept(self):
+        # the default picture (and pictures from before this storage) keep their names
+        FileSystemStorage(location=default_storage.location).save(
+            'no_picture.jpg', ContentFile(make_picture(size=(400, 600)).read()),
+        )
+        created = generate_derivatives('no_picture.jpg')
+        self.assertIn('no_picture.w150.webp', created)
+        self.assertEqual([d[0] for d in available_derivatives('no_picture.jpg')], [150, 300])
+        # nothing is left to write for it
+        self.assertEqual(generate_derivatives('no_picture.jpg'), [])
+
+    def test_media_is_cached_forever(self):
+        name = default_storage.save('emma.jpg', ContentFile(b'picture'))
+        # the media URLs are only routed under DEBUG, so the view is called directly
+        request = RequestFactory().get(f'/media/{name}')
+        response = media_view(request, name, document_root=default_storage.location)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_dedupe_media_command(self):
+        legacy = FileSystemStorage(location=default_storage.location)
+        picture = make_picture(size=(100, 150)).read()
+        for name in ('books/a.jpg', 'books/b.jpg', 'customers/c.jpg'):
+            legacy.save(name, ContentFile(picture))
+        Book.objects.create(name='A', author_name='X', price=1.0, pic='books/a.jpg')
+        Book.objects.create(name='B', author_name='X', price=1.0, pic='books/b.jpg')
+        Customer.objects.create(name='C', notes='', pic='customers/c.jpg')
+
+        call_command('dedupe_media', stdout=open(os.devnull, 'w'))
+
+        names = set(Book.objects.values_list('pic', flat=True)) | set(Customer.objects.values_list('pic', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(default_storage.exists(names.pop()))
+        self.assertFalse(legacy.exists('books/a.jpg'))
+
+
+
+class StaticFilesMiddlewareTest(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        for directory in (self.source, self.static_root, self.media_root):
+            self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(self.source, 'site.css'), 'w') as f:
+            f.write('body { color: #333; }\n' * 100)
+
+        settings_override = override_settings(
+            BOOKSTORE_SERVE_FILES=True,
+            STATICFILES_DIRS=[self.source],
+            STATIC_ROOT=self.static_root,
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                'default': {'BACKEND': 'bookstore.storage.ContentAddressedStorage'},
+                'staticfiles': {'BACKEND': 'bookstore.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as f:
+            self.hashed_name = json.load(f)['paths']['site.css']
+
+    def test_precompressed_variant(self):
+        response = self.client.get(f'/static/{self.hashed_name}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertTrue(body.startswith(b'body { color: #333; }'))
+
+    def test_identity_without_accept_encoding(self):
+        response = self.client.get('/static/site.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(int(response['Content-Length']), 2200)
+        # not hashed, so cached only briefly
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def test_hashed_files_are_immutable(self):
+        response = self.client.get(f'/static/{self.hashed_name}')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_conditional_request(self):
+        response = self.client.get('/static/site.css')
+        response = self.client.get('/static/site.css', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        name = default_storage.save('notes.txt', ContentFile(b'0123456789'))
+        response = self.client.get(f'/media/{name}', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.client.get(f'/media/{name}', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(f'/media/{name}', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_missing_and_outside_files_fall_through(self):
+        self.assertEqual(self.client.get('/static/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/media/..%2F..%2Fetc/passwd').status_code, 404)
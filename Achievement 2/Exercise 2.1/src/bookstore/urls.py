@@ -8,7 +8,7 @@ from django.contrib import admin
 from django.urls import path, include  # Make sure to import include
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import login_view, logout_view
+from .views import login_view, logout_view, media_view, stats_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -16,7 +16,8 @@ urlpatterns = [
     path('books/', include('books.urls')),  # Include books app URLs
     path('login/', login_view, name='login'),
     path('logout/', logout_view, name='logout'),
+    path('stats/', stats_view, name='stats'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=media_view, document_root=settings.MEDIA_ROOT)
@@ -3,6 +3,14 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 # Django Form for authentication
 from django.contrib.auth.forms import AuthenticationForm    
+# to protect the stats view
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from .profiling import get_stats
+from .staticfiles import IMMUTABLE_MAX_AGE
+from .storage import is_content_addressed
 
 # define a function view called login_view that takes a request from user
 def login_view(request):
@@ -44,3 +52,18 @@ def login_view(request):
 def logout_view(request):                                  
     logout(request)             # the use pre-defined Django function to logout
     return redirect('login')    # after logging out go to login form (or whichever page you want)
+
+
+# define a function view called stats_view that returns the request profiling percentiles
+@staff_member_required
+def stats_view(request):
+    return JsonResponse(get_stats())
+
+
+# define a function view called media_view that serves an uploaded file,
+# cacheable forever when it is content-addressed
+def media_view(request, path, document_root=None):
+    response = serve(request, path, document_root=document_root)
+    if response.status_code == 200 and is_content_addressed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
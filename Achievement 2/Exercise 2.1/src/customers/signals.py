@@ -0,0 +1,8 @@
+from django.db.models.signals import post_save, pre_save
+
+from bookstore.images import picture_saved, picture_saving
+from .models import Customer
+
+# thumbnails of the picture, made in the background when it changes
+pre_save.connect(picture_saving, sender=Customer, dispatch_uid='customers.picture_saving')
+post_save.connect(picture_saved, sender=Customer, dispatch_uid='customers.picture_saved')
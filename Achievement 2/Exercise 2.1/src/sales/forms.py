@@ -6,7 +6,25 @@ CHART__CHOICES = (          # specify choices as a tuple
    ('#3', 'Line chart')
    )
 
+GRANULARITY__CHOICES = (    # how sales are grouped before charting
+   ('', 'No grouping'),     # chart the individual sales (capped)
+   ('day', 'Per day'),      # sums of quantity and price per day
+   ('week', 'Per week'),
+   ('month', 'Per month')
+   )
+
+PAGE_SIZE__CHOICES = (      # rows of the records table per page
+   (25, '25'),
+   (50, '50'),
+   (100, '100'),
+   (200, '200')
+   )
+
 # define class-based Form imported from Django forms
 class SalesSearchForm(forms.Form): 
-   book_title = forms.CharField(max_length=120)
+   book_title = forms.CharField(max_length=120, widget=forms.TextInput(attrs={'list': 'book-titles', 'autocomplete': 'off'}))
+   book_id = forms.IntegerField(required=False, widget=forms.HiddenInput)   # set by the typeahead
    chart_type = forms.ChoiceField(choices=CHART__CHOICES)
+   granularity = forms.ChoiceField(choices=GRANULARITY__CHOICES, required=False)
+   page = forms.IntegerField(min_value=1, required=False, initial=1)
+   size = forms.TypedChoiceField(choices=PAGE_SIZE__CHOICES, coerce=int, required=False, initial=50)
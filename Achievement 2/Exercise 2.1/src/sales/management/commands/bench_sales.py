@@ -0,0 +1,186 @@
+# sales/management/commands/bench_sales.py
+# Benchmark the sales analytics path (records page and chart images).
+#
+#   python manage.py bench_sales --seed --books 1000 --sales 1000000 --output bench.json
+#
+# --seed fills the database with synthetic books and sales first (the same ones
+# for the same --random-seed); without it the existing data is used. The results are printed (or written) as JSON, so two
+# releases can be compared with a plain diff.
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from books.models import Book
+from sales.forms import CHART__CHOICES, GRANULARITY__CHOICES
+from sales.models import Sale
+from sales.rollups import rebuild_rollups
+from sales.utils import CHART_CACHE_ALIAS
+
+# names of the generated books start with this, so they are easy to find again
+BOOK_PREFIX = 'Benchmark book'
+# seed of the generated data, so every run (and release) benchmarks the same sales
+DEFAULT_RANDOM_SEED = 1234
+BENCH_USERNAME = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Time the sales records page and charts, reporting latency, queries and memory as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='generate synthetic books and sales before measuring')
+        parser.add_argument('--books', type=int, default=1000, help='books to generate (default: 1000)')
+        parser.add_argument('--sales', type=int, default=1000000, help='sales to generate (default: 1000000)')
+        parser.add_argument('--days', type=int, default=365, help='days the sales are spread over (default: 365)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT when seeding')
+        parser.add_argument('--random-seed', type=int, default=DEFAULT_RANDOM_SEED,
+                            help=f'seed of the generated data (default: {DEFAULT_RANDOM_SEED})')
+        parser.add_argument('--book', help='book to search for (default: the book with the most sales)')
+        parser.add_argument('--runs', type=int, default=10, help='measured requests per scenario (default: 10)')
+        parser.add_argument('--warm', action='store_true',
+                            help='keep the chart cache between runs (default: every run renders)')
+        parser.add_argument('--output', help='write the JSON to this file instead of the standard output')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be positive')
+
+        seed_seconds = None
+        if options['seed']:
+            started = time.perf_counter()
+            self.seed(options['books'], options['sales'], options['days'], options['batch_size'],
+                      random.Random(options['random_seed']))
+            seed_seconds = round(time.perf_counter() - started, 3)
+
+        book_title = options['book'] or self.busiest_book()
+        if book_title is None:
+            raise CommandError('no sales to benchmark, run with --seed')
+
+        client = self.get_client()
+        results = {
+            'book': book_title,
+            'sales_of_book': Sale.objects.filter(book__name=book_title).count(),
+            'total_sales': Sale.objects.count(),
+            'total_books': Book.objects.count(),
+            'runs': options['runs'],
+            'warm_cache': options['warm'],
+            'seed_seconds': seed_seconds,
+            'random_seed': options['random_seed'] if options['seed'] else None,
+            'scenarios': [],
+        }
+
+        for chart_type, chart_name in CHART__CHOICES:
+            for granularity, granularity_name in GRANULARITY__CHOICES:
+                search = {'book_title': book_title, 'chart_type': chart_type, 'granularity': granularity}
+                results['scenarios'].append({
+                    'chart': chart_name,
+                    'granularity': granularity or 'none',
+                    'records': self.measure(options, lambda: client.post(reverse('sales:records'), search)),
+                    'chart_image': self.measure(options, lambda: client.get(reverse('sales:chart'), search)),
+                })
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def seed(self, books, sales, days, batch_size, rng):
+        # books first, then the sales in batches of batch_size rows;
+        # rng (a seeded random.Random) makes the same data on every run
+        now = timezone.now()
+        with transaction.atomic():
+            first = Book.objects.count()
+            Book.objects.bulk_create(
+                (Book(name=f'{BOOK_PREFIX} {first + i}', author_name='Benchmark author',
+                      price=round(rng.uniform(5, 50), 2))
+                 for i in range(books)),
+                batch_size=batch_size,
+            )
+            book_ids = list(
+                Book.objects.filter(name__startswith=BOOK_PREFIX).values_list('id', flat=True)
+            )
+            if not book_ids:
+                raise CommandError('--books must be positive')
+
+            created = 0
+            while created < sales:
+                count = min(batch_size, sales - created)
+                Sale.objects.bulk_create([
+                    Sale(
+                        # a few books sell most, like real best-sellers
+                        book_id=book_ids[min(int(rng.paretovariate(1.2)) - 1, len(book_ids) - 1)],
+                        quantity=rng.randint(1, 5),
+                        price=round(rng.uniform(5, 250), 2),
+                        date_created=now - timedelta(seconds=rng.randint(0, days * 86400)),
+                    )
+                    for _ in range(count)
+                ])
+                created += count
+                self.stderr.write(f'{created} sales generated')
+
+        rebuild_rollups(book_ids)
+        caches[CHART_CACHE_ALIAS].clear()
+
+    def busiest_book(self):
+        book = Book.objects.annotate(sales=Count('sale')).order_by('-sales').first()
+        return book.name if book is not None and book.sales else None
+
+    def get_client(self):
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+        # a host ALLOWED_HOSTS accepts; with DEBUG and no hosts, localhost is allowed
+        host = 'localhost'
+        if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*':
+            host = settings.ALLOWED_HOSTS[0].lstrip('.')
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+        return client
+
+    def measure(self, options, request):
+        # one request first, so imports and connections are not measured
+        request()
+        latencies, queries = [], []
+        for _ in range(options['runs']):
+            if not options['warm']:
+                caches[CHART_CACHE_ALIAS].clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            if response.status_code != 200:
+                raise CommandError(f'request failed with status {response.status_code}')
+
+        # memory is traced in a separate run, tracing slows the requests down
+        if not options['warm']:
+            caches[CHART_CACHE_ALIAS].clear()
+        tracemalloc.start()
+        try:
+            request()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+        return {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[max(0, round(0.95 * len(latencies)) - 1)], 3),
+            'queries': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
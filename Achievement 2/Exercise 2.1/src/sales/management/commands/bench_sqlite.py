@@ -0,0 +1,151 @@
+# sales/management/commands/bench_sqlite.py
+# Show how readers fare while sales are being written, with SQLite's default
+# rollback journal and with the SQLITE_PRAGMAS of the settings (WAL).
+#
+#   python manage.py bench_sqlite --readers 4 --duration 5 --output sqlite.json
+#
+# Each mode gets a scratch database file: one thread keeps inserting batches of
+# sales in transactions, like import_sales, while the reader threads keep
+# summing them, like the charts. The reader latencies (and the reads that gave
+# up on "database is locked") are printed as JSON.
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SCHEMA = (
+    'CREATE TABLE sale (id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL, '
+    'quantity INTEGER NOT NULL, price REAL NOT NULL, date_created TEXT NOT NULL)'
+)
+INSERT = 'INSERT INTO sale (book_id, quantity, price, date_created) VALUES (?, ?, ?, ?)'
+READ = 'SELECT count(*), sum(quantity * price) FROM sale WHERE book_id = ?'
+
+BOOKS = 100
+
+
+class Command(BaseCommand):
+    help = 'Measure SQLite reader latency under a concurrent writer, rollback journal vs the tuned pragmas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='reader threads (default: 4)')
+        parser.add_argument('--duration', type=float, default=5.0, help='seconds per mode (default: 5)')
+        parser.add_argument('--rows', type=int, default=50000, help='sales in the database at the start')
+        parser.add_argument('--batch-size', type=int, default=5000, help='sales per write transaction')
+        parser.add_argument('--output', help='write the JSON to this file instead of the standard output')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 1 or options['duration'] <= 0:
+            raise CommandError('--readers and --duration must be positive')
+
+        # the same lock timeout in both modes, so only the journal differs
+        busy_timeout = settings.SQLITE_PRAGMAS.get('busy_timeout', 5000)
+        modes = {
+            'rollback_journal': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': busy_timeout},
+            'tuned': settings.SQLITE_PRAGMAS,
+        }
+        results = {
+            'readers': options['readers'],
+            'duration_s': options['duration'],
+            'batch_size': options['batch_size'],
+            'modes': {},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, pragmas in modes.items():
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                self.create(path, pragmas, options['rows'])
+                results['modes'][mode] = self.run(path, pragmas, options)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def connect(self, path, pragmas):
+        # autocommit; transactions are opened explicitly by the writer
+        db = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            db.execute(f'PRAGMA {name}={value}')
+        return db
+
+    def rows(self, count):
+        return [
+            (random.randrange(BOOKS), random.randint(1, 5), round(random.uniform(5, 250), 2), '2025-01-01 00:00:00')
+            for _ in range(count)
+        ]
+
+    def create(self, path, pragmas, rows):
+        db = self.connect(path, pragmas)
+        db.execute(SCHEMA)
+        db.execute('CREATE INDEX sale_book_idx ON sale (book_id)')
+        db.execute('BEGIN')
+        db.executemany(INSERT, self.rows(rows))
+        db.execute('COMMIT')
+        db.close()
+
+    def run(self, path, pragmas, options):
+        stop = threading.Event()
+        latencies, locked, writes = [], [0], [0]
+        lock = threading.Lock()
+
+        def writer():
+            db = self.connect(path, pragmas)
+            while not stop.is_set():
+                batch = self.rows(options['batch_size'])
+                try:
+                    db.execute('BEGIN IMMEDIATE')
+                    db.executemany(INSERT, batch)
+                    db.execute('COMMIT')
+                    writes[0] += 1
+                except sqlite3.OperationalError:
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+            db.close()
+
+        def reader():
+            db = self.connect(path, pragmas)
+            mine, failed = [], 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.execute(READ, (random.randrange(BOOKS),)).fetchone()
+                except sqlite3.OperationalError:
+                    # waited busy_timeout for the writer and gave up
+                    failed += 1
+                    continue
+                mine.append((time.perf_counter() - started) * 1000)
+            db.close()
+            with lock:
+                latencies.extend(mine)
+                locked[0] += failed
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        if not latencies:
+            return {'reads': 0, 'locked_reads': locked[0], 'write_batches': writes[0]}
+        return {
+            'reads': len(latencies),
+            'reads_per_s': round(len(latencies) / options['duration'], 1),
+            'locked_reads': locked[0],
+            'write_batches': writes[0],
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[max(0, round(0.95 * len(latencies)) - 1)], 3),
+            'max_ms': round(latencies[-1], 3),
+        }
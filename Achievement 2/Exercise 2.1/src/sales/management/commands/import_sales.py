@@ -0,0 +1,137 @@
+# sales/management/commands/import_sales.py
+# Load a point-of-sale export (CSV or JSON lines) into Sale.
+#
+#   python manage.py import_sales sales.csv --batch-size 1000 --chunk-size 50000
+#
+# Every row needs "book" (the book name), "quantity" and "price";
+# "date_created" (ISO 8601) is optional and defaults to now.
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from books.models import Book
+from sales.models import Sale
+from sales.rollups import batched_ids, get_rollup_key, refresh_rollups
+from sales.utils import bump_chart_version
+
+
+class Command(BaseCommand):
+    help = 'Import sales from a CSV or JSON lines file with batched inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON lines (.jsonl, .ndjson) file to import')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='file format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='rows per INSERT statement (default: 1000)')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='rows per transaction (default: 50000)')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+        if options['batch_size'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--batch-size and --chunk-size must be positive')
+
+        fmt = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.ndjson') else 'csv')
+
+        # book name -> id, loaded once instead of one lookup per row
+        book_ids = {}
+        for book_id, name in Book.objects.values_list('id', 'name').order_by('-id'):
+            book_ids[name] = book_id    # on duplicate names the oldest book wins
+
+        imported = 0
+        self.skipped = 0    # rows of unknown books
+        touched = set()     # (book id, day) of the new sales
+        started = time.perf_counter()
+
+        try:
+            with path.open(newline='', encoding='utf-8') as f:
+                rows = self.read_rows(f, fmt)
+                sales = self.build_sales(rows, book_ids, touched)
+
+                # the file is read lazily, one transaction worth of rows at a time
+                while True:
+                    chunk = list(islice(sales, options['chunk_size']))
+                    if not chunk:
+                        break
+                    with transaction.atomic():
+                        Sale.objects.bulk_create(chunk, batch_size=options['batch_size'])
+                    imported += len(chunk)
+                    self.stdout.write(f'{imported} sales imported ({self.rate(imported, started)} rows/sec)')
+        finally:
+            # bulk_create sends no signals, so the rollups and charts are updated
+            # here, also when a bad row stops the import after committed chunks
+            self.refresh(touched)
+
+        if self.skipped:
+            self.stderr.write(f'{self.skipped} rows skipped (unknown book)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} sales in {time.perf_counter() - started:.1f}s '
+            f'({self.rate(imported, started)} rows/sec)'
+        ))
+
+    def refresh(self, touched):
+        # recompute the rollups of the days with new sales and invalidate the
+        # cached charts of their books
+        refresh_rollups(touched)
+        for batch in batched_ids({book_id for book_id, day in touched}):
+            for name in Book.objects.filter(id__in=batch).values_list('name', flat=True):
+                bump_chart_version(name)
+
+    def read_rows(self, f, fmt):
+        # yields (line number, row dictionary) without reading the whole file
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_num, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise CommandError(f'line {line_num}: invalid JSON ({e})')
+
+    def build_sales(self, rows, book_ids, touched):
+        # turns rows into unsaved Sale objects; rows of unknown books are counted
+        now = timezone.now()
+        for line_num, row in rows:
+            book_id = book_ids.get(row.get('book'))
+            if book_id is None:
+                self.skipped += 1
+                continue
+
+            try:
+                date_created = now
+                if row.get('date_created'):
+                    date_created = parse_datetime(str(row['date_created']))
+                    if date_created is None:
+                        raise ValueError(f"invalid date {row['date_created']!r}")
+                    if timezone.is_naive(date_created):
+                        date_created = timezone.make_aware(date_created)
+                sale = Sale(
+                    book_id=book_id,
+                    quantity=int(row['quantity']),
+                    price=float(row['price']),
+                    date_created=date_created,
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                # the chunks before this one are already committed (and
+                # rolled up by handle())
+                raise CommandError(f'line {line_num}: {e}')
+
+            touched.add(get_rollup_key(sale))
+            yield sale
+
+    def rate(self, count, started):
+        elapsed = time.perf_counter() - started
+        return int(count / elapsed) if elapsed else count
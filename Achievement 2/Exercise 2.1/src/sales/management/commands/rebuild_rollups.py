@@ -0,0 +1,33 @@
+# sales/management/commands/rebuild_rollups.py
+# Backfill (or repair) the daily sales rollups from the raw sales.
+#
+#   python manage.py rebuild_rollups [--book "Book name" ...]
+from django.core.management.base import BaseCommand, CommandError
+
+from books.models import Book
+from sales.rollups import rebuild_rollups
+from sales.utils import bump_chart_version
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups from the Sale table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book', action='append', dest='books', metavar='NAME',
+                            help='only rebuild this book (can be repeated)')
+
+    def handle(self, *args, **options):
+        book_ids = None
+        if options['books']:
+            book_ids = list(Book.objects.filter(name__in=options['books']).values_list('id', flat=True))
+            if not book_ids:
+                raise CommandError('no book found with that name')
+
+        created = rebuild_rollups(book_ids)
+
+        # the rollups feed the grouped charts
+        books = Book.objects.all() if book_ids is None else Book.objects.filter(id__in=book_ids)
+        for name in books.values_list('name', flat=True).iterator():
+            bump_chart_version(name)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily rollups'))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2025-11-03 10:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_author_name'),
+        ('sales', '0002_sale_pic'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='sale',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='sale',
+            name='notes',
+        ),
+        migrations.RemoveField(
+            model_name='sale',
+            name='pic',
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='book',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to='books.book'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='date_created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='price',
+            field=models.FloatField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='quantity',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+    ]
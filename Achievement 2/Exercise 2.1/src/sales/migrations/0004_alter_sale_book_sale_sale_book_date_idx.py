@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_alter_book_name'),
+        ('sales', '0003_remove_sale_name_remove_sale_notes_remove_sale_pic_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='books.book'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['book', 'date_created'], name='sale_book_date_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_alter_sale_book_sale_sale_book_date_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='date_created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_alter_book_name'),
+        ('sales', '0005_sale_date_created_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('total_revenue', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='books.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'day'), name='rollup_book_day_uniq')],
+            },
+        ),
+    ]
@@ -1,13 +1,39 @@
 from django.db import models
+from django.utils import timezone
 from books.models import Book
 
 
 # Create your models here.
 class Sale (models.Model):
-    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    # indexed through the (book, date_created) index below
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
     quantity = models.IntegerField()
     price = models.FloatField()
-    date_created = models.DateTimeField(auto_now_add=True)
+    # set on creation like auto_now_add, but imported sales keep their own date
+    date_created = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # the sales of one book, in date order (records page and charts)
+            models.Index(fields=['book', 'date_created'], name='sale_book_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"id: {self.id}, book: {self.book.name}, quantity: {self.quantity}, price: {self.price}"
+
+# sales of one book on one day, summed up; kept up to date by sales/rollups.py
+class SaleDailyRollup(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    total_quantity = models.IntegerField(default=0)
+    total_revenue = models.FloatField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # also the index used to read a book's rollups in date order
+            models.UniqueConstraint(fields=['book', 'day'], name='rollup_book_day_uniq'),
+        ]
 
     def __str__(self):
-        return f"id: {self.id}, book: {self.book.name}, quantity: {self.quantity}, price: {self.price}"
\ No newline at end of file
+        return f"book: {self.book_id}, day: {self.day}, quantity: {self.total_quantity}, revenue: {self.total_revenue}"
@@ -0,0 +1,136 @@
+# sales/rollups.py
+# Keeps SaleDailyRollup in line with Sale: one bucket is refreshed when a sale
+# changes (see signals.py), the buckets of an import by import_sales, and
+# everything is rebuilt by "manage.py rebuild_rollups".
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Sale, SaleDailyRollup
+
+# rollup rows written per INSERT when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+# book ids per "IN (...)" query, well under SQLite's limit on query parameters
+ID_BATCH_SIZE = 500
+
+
+# define a function that returns the rollup key (book id, day) of a sale
+def get_rollup_key(sale):
+    return sale.book_id, timezone.localdate(sale.date_created)
+
+
+# define a function that returns the bounds of a day, as a date range instead
+# of __date, so the (book, date_created) index is used
+def get_day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+# define a function that splits ids into lists of at most ID_BATCH_SIZE
+def batched_ids(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), ID_BATCH_SIZE):
+        yield ids[i:i + ID_BATCH_SIZE]
+
+
+# define a function that recomputes the rollup of one book on one day
+def refresh_rollup(book_id, day):
+    start, end = get_day_range(day)
+    # the sum and its write are one transaction, which takes the write lock
+    # when it begins (transaction_mode IMMEDIATE in settings.py): two sales
+    # saved at once on the same day are summed one after the other, each
+    # seeing the other's committed sale
+    with transaction.atomic():
+        totals = Sale.objects.filter(
+            book_id=book_id, date_created__gte=start, date_created__lt=end,
+        ).aggregate(total_quantity=Sum('quantity'), total_revenue=Sum('price'), count=Count('id'))
+
+        if not totals['count']:
+            # no sales left on that day
+            SaleDailyRollup.objects.filter(book_id=book_id, day=day).delete()
+            return
+
+        SaleDailyRollup.objects.update_or_create(book_id=book_id, day=day, defaults=totals)
+
+
+# define a function that recomputes the rollups of many (book id, day) pairs,
+# e.g. those of the sales of an import, without the rest of the books' history
+def refresh_rollups(keys):
+    book_ids_by_day = defaultdict(set)
+    for book_id, day in keys:
+        book_ids_by_day[day].add(book_id)
+
+    created = 0
+    with transaction.atomic():
+        for day, book_ids in sorted(book_ids_by_day.items()):
+            start, end = get_day_range(day)
+            for batch in batched_ids(book_ids):
+                totals = (
+                    Sale.objects.filter(book_id__in=batch, date_created__gte=start, date_created__lt=end)
+                    .order_by()
+                    .values('book_id')
+                    .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('price'), count=Count('id'))
+                )
+                SaleDailyRollup.objects.filter(book_id__in=batch, day=day).delete()
+                rollups = SaleDailyRollup.objects.bulk_create(
+                    [SaleDailyRollup(day=day, **row) for row in totals],
+                    batch_size=REBUILD_BATCH_SIZE,
+                )
+                created += len(rollups)
+    return created
+
+
+# define a function that rebuilds the rollups from scratch
+# book_ids: only rebuild these books (default: all books)
+def rebuild_rollups(book_ids=None):
+    if book_ids is None:
+        batches = [None]
+    else:
+        # a few hundred books per query, whatever the number of books
+        batches = list(batched_ids(set(book_ids)))
+
+    created = 0
+    with transaction.atomic():
+        for batch in batches:
+            sales = Sale.objects.all()
+            rollups = SaleDailyRollup.objects.all()
+            if batch is not None:
+                sales = sales.filter(book_id__in=batch)
+                rollups = rollups.filter(book_id__in=batch)
+            created += _rebuild(sales, rollups)
+    return created
+
+
+# define a function that replaces the rollups with the buckets of the sales
+def _rebuild(sales, rollups):
+    buckets = (
+        sales.order_by()
+        .annotate(bucket=TruncDate('date_created'))
+        .values('book_id', 'bucket')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('price'), count=Count('id'))
+    )
+
+    created = 0
+    rollups.delete()
+    batch = []
+    # iterate the buckets in chunks so a large table never sits in memory
+    for row in buckets.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        batch.append(SaleDailyRollup(
+            book_id=row['book_id'],
+            day=row['bucket'],
+            total_quantity=row['total_quantity'],
+            total_revenue=row['total_revenue'],
+            count=row['count'],
+        ))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            SaleDailyRollup.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    SaleDailyRollup.objects.bulk_create(batch)
+    created += len(batch)
+    return created
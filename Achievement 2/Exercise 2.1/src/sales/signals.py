@@ -0,0 +1,68 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from books.models import Book, books_being_deleted
+from .models import Sale
+from .rollups import get_rollup_key, refresh_rollup
+from .typeahead import title_index
+from .utils import bump_chart_version, forget_bookname, get_booknames_from_ids
+
+# a renamed or deleted book must not be served from the name cache
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed(sender, instance, **kwargs):
+    forget_bookname(instance.pk)
+    bump_chart_version(instance.name)
+
+
+# keep the typeahead titles up to date
+@receiver(post_save, sender=Book)
+def book_saved_title(sender, instance, **kwargs):
+    title_index.update(instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted_title(sender, instance, **kwargs):
+    title_index.remove(instance.pk)
+
+
+# a new, edited or removed sale makes the charts of its book stale
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def sale_changed(sender, instance, **kwargs):
+    # the sales (and rollups) of a deleted book go with it, and its charts are
+    # bumped once by book_changed
+    if instance.book_id in books_being_deleted():
+        return
+    # the name cache spares a query per sale
+    book_title = get_booknames_from_ids([instance.book_id]).get(instance.book_id)
+    if book_title is not None:
+        bump_chart_version(book_title)
+
+
+# remember which daily rollup an edited sale belonged to before the edit
+@receiver(pre_save, sender=Sale)
+def sale_saving(sender, instance, **kwargs):
+    instance._previous_rollup_key = None
+    if instance.pk is not None:
+        previous = Sale.objects.filter(pk=instance.pk).only('book_id', 'date_created').first()
+        if previous is not None:
+            instance._previous_rollup_key = get_rollup_key(previous)
+
+
+# keep the daily rollups of the changed sale up to date
+@receiver(post_save, sender=Sale)
+def sale_saved_rollup(sender, instance, **kwargs):
+    key = get_rollup_key(instance)
+    refresh_rollup(*key)
+    previous_key = getattr(instance, '_previous_rollup_key', None)
+    if previous_key is not None and previous_key != key:
+        # the sale moved to another book or day
+        refresh_rollup(*previous_key)
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted_rollup(sender, instance, **kwargs):
+    if instance.book_id in books_being_deleted():
+        return
+    refresh_rollup(*get_rollup_key(instance))
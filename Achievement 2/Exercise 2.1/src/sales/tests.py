@@ -1,3 +1,696 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.connection import ConnectionDoesNotExist
+
+from books.models import Book
+from .models import Sale, SaleDailyRollup
+from .rollups import refresh_rollups
+from .typeahead import MAX_EDIT_DISTANCE, TitleIndex, normalize, prefix_distance, title_index
+from .workers import shutdown_executor, submit_chart
+from .utils import (
+    BOOKNAME_CACHE_TTL, forget_bookname, get_booknames_from_ids, get_cached_chart, get_chart, get_chart_last_modified,
+    get_chart_series, get_chart_version, get_sales_series,
+)
+
+
+class SalesSeriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            name='Pride and Prejudice',
+            author_name='Jane Austen',
+            price=23.71,
+            genre='classic',
+            book_type='hardcover'
+        )
+        # two sales on the 1st of March, one on the 2nd and one in April
+        dates = [
+            datetime(2025, 3, 1, 9, tzinfo=timezone.utc),
+            datetime(2025, 3, 1, 17, tzinfo=timezone.utc),
+            datetime(2025, 3, 2, 12, tzinfo=timezone.utc),
+            datetime(2025, 4, 10, 12, tzinfo=timezone.utc),
+        ]
+        for quantity, date in enumerate(dates, start=1):
+            sale = Sale.objects.create(book=cls.book, quantity=quantity, price=10.0 * quantity)
+            # date_created is set automatically on create, so move it afterwards
+            Sale.objects.filter(pk=sale.pk).update(date_created=date)
+
+    def test_no_grouping_returns_every_sale(self):
+        series = get_sales_series(Sale.objects.filter(book=self.book))
+        self.assertEqual(list(series['quantity']), [1, 2, 3, 4])
+
+    def test_group_per_day(self):
+        series = get_sales_series(Sale.objects.filter(book=self.book), 'day')
+        # the two sales on the 1st of March are summed up
+        self.assertEqual(list(series['quantity']), [3, 3, 4])
+        self.assertEqual(list(series['price']), [30.0, 30.0, 40.0])
+
+    def test_group_per_month(self):
+        series = get_sales_series(Sale.objects.filter(book=self.book), 'month')
+        self.assertEqual(list(series['quantity']), [6, 4])
+
+
+class QueryPlanTest(TestCase):
+    def test_records_query_uses_indexes(self):
+        # the book is found through the index on its name and its sales
+        # through the (book, date_created) index, no table is scanned
+        plan = Sale.objects.filter(book__name='Emma').order_by('date_created').explain()
+        self.assertRegex(plan, r'SEARCH books_book USING (COVERING )?INDEX books_book_name_')
+        self.assertIn('SEARCH sales_sale USING INDEX sale_book_date_idx', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_sales_of_one_book_come_in_date_order(self):
+        # the index already returns the sales sorted, no sort step is needed
+        plan = Sale.objects.filter(book_id=1).order_by('-date_created').explain()
+        self.assertIn('USING INDEX sale_book_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class BooknameResolverTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(name=f'Book {i}', author_name='Author', price=1.0)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        for book in self.books:
+            forget_bookname(book.pk)
+
+    def test_resolves_all_ids_in_one_query(self):
+        ids = [book.pk for book in self.books] * 3
+        with self.assertNumQueries(1):
+            names = get_booknames_from_ids(ids)
+        self.assertEqual(names[self.books[2].pk], 'Book 2')
+
+    def test_hot_titles_come_from_cache(self):
+        get_booknames_from_ids([self.books[0].pk])
+        with self.assertNumQueries(0):
+            names = get_booknames_from_ids([self.books[0].pk])
+        self.assertEqual(names, {self.books[0].pk: 'Book 0'})
+
+    def test_renamed_book_is_resolved_again(self):
+        book = self.books[1]
+        get_booknames_from_ids([book.pk])
+        book.name = 'Renamed'
+        book.save()
+        self.assertEqual(get_booknames_from_ids([book.pk]), {book.pk: 'Renamed'})
+
+    def test_rename_in_another_process_is_seen_after_the_ttl(self):
+        book = self.books[2]
+        get_booknames_from_ids([book.pk])
+        # no signal reaches this process
+        Book.objects.filter(pk=book.pk).update(name='Renamed elsewhere')
+        self.assertEqual(get_booknames_from_ids([book.pk]), {book.pk: 'Book 2'})
+        later = time.monotonic() + BOOKNAME_CACHE_TTL + 1
+        with mock.patch('sales.utils.time.monotonic', return_value=later):
+            self.assertEqual(get_booknames_from_ids([book.pk]), {book.pk: 'Renamed elsewhere'})
+
+
+class ChartRenderingTest(TestCase):
+    def setUp(self):
+        self.data = pd.DataFrame({
+            'date_created': pd.date_range('2025-01-01', periods=5),
+            'quantity': [1, 2, 3, 4, 5],
+            'price': [10.0, 20.0, 30.0, 40.0, 50.0],
+        })
+
+    def render(self, chart_type):
+        buffer = BytesIO()
+        get_chart(chart_type, self.data, output=buffer, labels=self.data['date_created'].values)
+        return buffer.getvalue()
+
+    def test_returns_base64_without_output(self):
+        chart = get_chart('#3', self.data)
+        self.assertIsInstance(chart, str)
+
+    def test_pyplot_is_not_used(self):
+        import matplotlib.pyplot as plt
+        self.render('#1')
+        # nothing was registered with the pyplot state machine
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_concurrent_renders_do_not_mix(self):
+        expected = {chart_type: self.render(chart_type) for chart_type in ('#1', '#2', '#3')}
+        jobs = ['#1', '#2', '#3'] * 4
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            images = list(pool.map(self.render, jobs))
+        for chart_type, image in zip(jobs, images):
+            self.assertEqual(image, expected[chart_type])
+
+
+class ChartCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(name='Persuasion', author_name='Jane Austen', price=9.0)
+
+    def setUp(self):
+        caches['charts'].clear()
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return f'chart {self.renders}'
+
+    def test_same_chart_is_rendered_once(self):
+        first = get_cached_chart('Persuasion', '#1', 'day', self.render)
+        second = get_cached_chart('Persuasion', '#1', 'day', self.render)
+        self.assertEqual(first, second)
+        self.assertEqual(self.renders, 1)
+
+    def test_chart_type_and_granularity_are_part_of_the_key(self):
+        get_cached_chart('Persuasion', '#1', 'day', self.render)
+        get_cached_chart('Persuasion', '#2', 'day', self.render)
+        get_cached_chart('Persuasion', '#1', 'month', self.render)
+        self.assertEqual(self.renders, 3)
+
+    def test_saving_a_sale_invalidates_the_chart(self):
+        get_cached_chart('Persuasion', '#1', 'day', self.render)
+        sale = Sale.objects.create(book=self.book, quantity=1, price=9.0)
+        self.assertEqual(get_cached_chart('Persuasion', '#1', 'day', self.render), 'chart 2')
+        sale.delete()
+        self.assertEqual(get_cached_chart('Persuasion', '#1', 'day', self.render), 'chart 3')
+
+    def test_deleting_a_book_with_sales(self):
+        Sale.objects.create(book=self.book, quantity=1, price=9.0)
+        get_cached_chart('Persuasion', '#1', 'day', self.render)
+        self.book.delete()
+        self.assertEqual(get_cached_chart('Persuasion', '#1', 'day', self.render), 'chart 2')
+
+
+class RecordsViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='tester', password='secret-pass-123')
+        cls.book = Book.objects.create(
+            name='Emma',
+            author_name='Jane Austen',
+            price=12.5,
+            genre='classic',
+            book_type='ebook'
+        )
+        Sale.objects.bulk_create(
+            Sale(book=cls.book, quantity=1, price=12.5) for _ in range(60)
+        )
+
+    def setUp(self):
+        caches['charts'].clear()
+        self.client.force_login(self.user)
+
+    def test_records_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('sales:records'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_records_paginates_table(self):
+        response = self.client.post(reverse('sales:records'), {
+            'book_title': 'Emma', 'chart_type': '#1', 'granularity': 'day', 'page': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        # 60 sales with 50 per page leaves 10 on the second page
+        self.assertEqual(len(page_obj.object_list), 10)
+        self.assertContains(response, reverse('sales:chart'))
+
+    def test_records_page_size_and_paging_links(self):
+        response = self.client.get(reverse('sales:records'), {
+            'book_title': 'Emma', 'chart_type': '#1', 'size': 25, 'page': 3,
+        })
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.num_pages, 3)
+        self.assertEqual(len(page_obj.object_list), 10)
+        self.assertContains(response, 'size=25&amp;page=2')
+
+    def test_export_streams_every_sale(self):
+        response = self.client.get(reverse('sales:export'), {'book_title': 'Emma'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,book,quantity,price,date_created')
+        self.assertEqual(len(lines), 61)
+        self.assertTrue(lines[1].split(',')[1] == 'Emma')
+
+    def test_records_query_count_does_not_grow_with_rows(self):
+        data = {'book_title': 'Emma', 'chart_type': '#1'}
+        forget_bookname(self.book.pk)
+        # session, user, exists, count, page and book name
+        with self.assertNumQueries(6):
+            self.client.post(reverse('sales:records'), data)
+        Sale.objects.bulk_create(
+            Sale(book=self.book, quantity=2, price=12.5) for _ in range(500)
+        )
+        forget_bookname(self.book.pk)
+        with self.assertNumQueries(6):
+            self.client.post(reverse('sales:records'), data)
+
+    def test_records_of_a_picked_book(self):
+        # another book with the same title, and its sales
+        other = Book.objects.create(name='Emma', author_name='Someone else', price=3.0)
+        Sale.objects.bulk_create(Sale(book=other, quantity=1, price=3.0) for _ in range(5))
+        data = {'book_title': 'Emma', 'book_id': other.pk, 'chart_type': '#1'}
+        response = self.client.post(reverse('sales:records'), data)
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+        self.assertContains(response, f'book_id={other.pk}')
+
+        # renamed meanwhile (e.g. by another process): found by its id, under its new title
+        Book.objects.filter(pk=other.pk).update(name='Emma (abridged)')
+        response = self.client.post(reverse('sales:records'), data)
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+        self.assertContains(response, 'book_title=Emma+%28abridged%29')
+
+        response = self.client.get(reverse('sales:export'), {'book_title': 'Emma', 'book_id': other.pk})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 6)
+
+    def test_records_unknown_book(self):
+        response = self.client.post(reverse('sales:records'), {
+            'book_title': 'Unknown', 'chart_type': '#1',
+        })
+        self.assertContains(response, 'no data')
+
+
+class ChartViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='tester', password='secret-pass-123')
+        cls.book = Book.objects.create(name='Emma', author_name='Jane Austen', price=12.5)
+        Sale.objects.create(book=cls.book, quantity=3, price=37.5)
+
+    def setUp(self):
+        caches['charts'].clear()
+        self.client.force_login(self.user)
+        self.params = {'book_title': 'Emma', 'chart_type': '#1', 'granularity': 'day'}
+
+    def test_chart_is_served_as_png(self):
+        response = self.client.get(reverse('sales:chart'), self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_chart_as_svg(self):
+        response = self.client.get(reverse('sales:chart'), {**self.params, 'format': 'svg'})
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+
+    def test_repeat_view_gets_not_modified(self):
+        first = self.client.get(reverse('sales:chart'), self.params)
+        second = self.client.get(reverse('sales:chart'), self.params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_new_sale_changes_etag(self):
+        first = self.client.get(reverse('sales:chart'), self.params)
+        Sale.objects.create(book=self.book, quantity=1, price=12.5)
+        second = self.client.get(reverse('sales:chart'), self.params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+
+    def test_cached_chart_is_streamed_again(self):
+        first = self.client.get(reverse('sales:chart'), self.params)
+        second = self.client.get(reverse('sales:chart'), self.params)
+        self.assertEqual(first.content, second.content)
+
+    def test_chart_of_a_picked_book(self):
+        other = Book.objects.create(name='Emma', author_name='Someone else', price=3.0)
+        Sale.objects.create(book=other, quantity=9, price=27.0)
+        both = self.client.get(reverse('sales:chart'), self.params)
+        picked = self.client.get(reverse('sales:chart'), {**self.params, 'book_id': other.pk})
+        self.assertEqual(picked.status_code, 200)
+        self.assertNotEqual(both.content, picked.content)
+        self.assertNotEqual(both['ETag'], picked['ETag'])
+
+    def test_unknown_chart_type(self):
+        response = self.client.get(reverse('sales:chart'), {**self.params, 'chart_type': '#9'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_line_breaks_in_parameters(self):
+        # not copied into the ETag header: 404, not a header error
+        for name in ('chart_type', 'granularity', 'format', 'book_id'):
+            response = self.client.get(reverse('sales:chart'), {**self.params, name: 'day\r\nX-Injected: 1'})
+            self.assertEqual(response.status_code, 404)
+
+    def test_version_evicted_right_after_it_was_added(self):
+        with mock.patch.object(caches['charts'], 'get', return_value=None):
+            version = get_chart_version('Emma')
+            self.assertIsInstance(version, int)
+            self.assertIsNotNone(get_chart_last_modified('Emma'))
+
+
+@override_settings(SALES_CHART_WORKERS=1)
+class ChartWorkerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='tester', password='secret-pass-123')
+        cls.book = Book.objects.create(name='Emma', author_name='Jane Austen', price=12.5)
+        Sale.objects.create(book=cls.book, quantity=3, price=37.5)
+
+    def setUp(self):
+        caches['charts'].clear()
+        self.client.force_login(self.user)
+        self.addCleanup(shutdown_executor)
+
+    def test_chart_is_rendered_in_the_pool(self):
+        future = submit_chart('Emma', '#2', 'day')
+        image = future.result(timeout=60)
+        self.assertTrue(image.startswith(b'\x89PNG'))
+
+        # the image endpoint serves what the worker rendered
+        response = self.client.get(reverse('sales:chart'), {
+            'book_title': 'Emma', 'chart_type': '#2', 'granularity': 'day',
+        })
+        self.assertEqual(response.content, image)
+
+    def test_rendered_chart_is_not_submitted_again(self):
+        first = submit_chart('Emma', '#1', '')
+        first.result(timeout=60)
+        # either still pending (same future) or already in the cache (None)
+        self.assertIn(submit_chart('Emma', '#1', ''), (first, None))
+
+    def test_concurrent_requests_submit_a_chart_once(self):
+        series_df = get_chart_series('Emma', 'week')
+
+        def slow_series(*args, **kwargs):
+            time.sleep(0.2)     # the other request comes meanwhile
+            return series_df
+
+        with mock.patch('sales.utils.get_chart_series', side_effect=slow_series) as series:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = list(pool.map(lambda _: submit_chart('Emma', '#3', 'week'), range(2)))
+        self.assertIs(futures[0], futures[1])
+        self.assertEqual(series.call_count, 1)
+        self.assertTrue(futures[0].result(timeout=60).startswith(b'\x89PNG'))
+
+
+class ImportSalesCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.emma = Book.objects.create(name='Emma', author_name='Jane Austen', price=12.5)
+        cls.persuasion = Book.objects.create(name='Persuasion', author_name='Jane Austen', price=9.0)
+
+    def write_file(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv_in_batches(self):
+        lines = ['book,quantity,price,date_created']
+        lines += [f'Emma,{i},12.5,2025-03-0{i % 9 + 1}T10:00:00' for i in range(25)]
+        lines += ['Persuasion,2,18.0,', 'Unknown,1,1.0,']
+        path = self.write_file('.csv', '\n'.join(lines))
+
+        out, err = StringIO(), StringIO()
+        call_command('import_sales', path, batch_size=4, chunk_size=10, stdout=out, stderr=err)
+
+        self.assertEqual(Sale.objects.filter(book=self.emma).count(), 25)
+        self.assertEqual(Sale.objects.filter(book=self.persuasion).count(), 1)
+        # dates from the file are kept
+        self.assertEqual(Sale.objects.filter(book=self.emma, date_created__day=1).count(), 3)
+        self.assertIn('Imported 26 sales', out.getvalue())
+        # the rollups are rebuilt for the imported books
+        self.assertEqual(SaleDailyRollup.objects.filter(book=self.emma).count(), 9)
+        self.assertIn('1 rows skipped', err.getvalue())
+
+    def test_import_jsonl(self):
+        rows = [{'book': 'Persuasion', 'quantity': 3, 'price': 27.0}] * 3
+        path = self.write_file('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        call_command('import_sales', path, stdout=StringIO())
+        self.assertEqual(Sale.objects.filter(book=self.persuasion).count(), 3)
+
+    def test_import_invalidates_charts(self):
+        caches['charts'].clear()
+        get_cached_chart('Emma', '#1', 'day', lambda: 'old chart')
+        path = self.write_file('.csv', 'book,quantity,price\nEmma,1,12.5')
+        call_command('import_sales', path, stdout=StringIO())
+        self.assertEqual(get_cached_chart('Emma', '#1', 'day', lambda: 'new chart'), 'new chart')
+
+    def test_bad_row(self):
+        path = self.write_file('.csv', 'book,quantity,price\nEmma,many,12.5')
+        with self.assertRaisesMessage(CommandError, 'line 2'):
+            call_command('import_sales', path, stdout=StringIO())
+
+    def test_bad_row_after_committed_chunks(self):
+        caches['charts'].clear()
+        get_cached_chart('Emma', '#1', 'day', lambda: 'old chart')
+        lines = ['book,quantity,price,date_created']
+        lines += [f'Emma,1,12.5,2025-03-0{i + 1}T10:00:00' for i in range(4)]
+        lines += ['Emma,many,12.5,']
+        path = self.write_file('.csv', '\n'.join(lines))
+        with self.assertRaisesMessage(CommandError, 'line 6'):
+            call_command('import_sales', path, chunk_size=2, stdout=StringIO())
+        # the committed chunks are rolled up and the charts show them
+        self.assertEqual(Sale.objects.filter(book=self.emma).count(), 4)
+        self.assertEqual(SaleDailyRollup.objects.filter(book=self.emma).count(), 4)
+        self.assertEqual(get_cached_chart('Emma', '#1', 'day', lambda: 'new chart'), 'new chart')
+
+
+class SaleDailyRollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.emma = Book.objects.create(name='Emma', author_name='Jane Austen', price=12.5)
+        cls.persuasion = Book.objects.create(name='Persuasion', author_name='Jane Austen', price=9.0)
+
+    def sale(self, book, quantity, day, hour=12):
+        date = datetime(2025, 3, day, hour, tzinfo=timezone.utc)
+        return Sale.objects.create(book=book, quantity=quantity, price=10.0 * quantity, date_created=date)
+
+    def rollups(self, book):
+        return list(
+            SaleDailyRollup.objects.filter(book=book).order_by('day')
+            .values_list('day__day', 'total_quantity', 'total_revenue', 'count')
+        )
+
+    def test_new_sales_are_added_to_their_day(self):
+        self.sale(self.emma, 1, 1, hour=9)
+        self.sale(self.emma, 2, 1, hour=18)
+        self.sale(self.emma, 4, 2)
+        self.assertEqual(self.rollups(self.emma), [(1, 3, 30.0, 2), (2, 4, 40.0, 1)])
+
+    def test_edited_sale_moves_between_days_and_books(self):
+        sale = self.sale(self.emma, 2, 1)
+        sale.date_created = datetime(2025, 3, 5, 12, tzinfo=timezone.utc)
+        sale.save()
+        self.assertEqual(self.rollups(self.emma), [(5, 2, 20.0, 1)])
+
+        sale.book = self.persuasion
+        sale.save()
+        self.assertEqual(self.rollups(self.emma), [])
+        self.assertEqual(self.rollups(self.persuasion), [(5, 2, 20.0, 1)])
+
+    def test_deleted_sale_is_removed(self):
+        self.sale(self.emma, 1, 1)
+        sale = self.sale(self.emma, 2, 1)
+        sale.delete()
+        self.assertEqual(self.rollups(self.emma), [(1, 1, 10.0, 1)])
+
+    def test_deleting_a_book_does_not_refresh_per_sale(self):
+        Sale.objects.bulk_create(
+            Sale(book=self.emma, quantity=1, price=10.0, date_created=datetime(2025, 3, 1 + i % 28, tzinfo=timezone.utc))
+            for i in range(200)
+        )
+        call_command('rebuild_rollups', stdout=StringIO())
+        # the sales are fetched once and deleted in batches (of 100 on SQLite),
+        # with no rollup or chart query per sale
+        with self.assertNumQueries(6):
+            self.emma.delete()
+        self.assertFalse(SaleDailyRollup.objects.filter(book_id=self.emma.pk).exists())
+        # the sales of the other books are still rolled up
+        self.sale(self.persuasion, 3, 2)
+        self.assertEqual(self.rollups(self.persuasion), [(2, 3, 30.0, 1)])
+
+    def test_refresh_rollups_of_touched_days(self):
+        self.sale(self.emma, 1, 1)
+        self.sale(self.persuasion, 2, 1)
+        self.sale(self.emma, 3, 2)
+        # stale rows, out of the signals' sight
+        SaleDailyRollup.objects.update(total_quantity=0)
+        # one book per query
+        with mock.patch('sales.rollups.ID_BATCH_SIZE', 1):
+            refresh_rollups([(self.emma.pk, date(2025, 3, 1)), (self.persuasion.pk, date(2025, 3, 1))])
+        self.assertEqual(self.rollups(self.emma), [(1, 1, 10.0, 1), (2, 0, 30.0, 1)])
+        self.assertEqual(self.rollups(self.persuasion), [(1, 2, 20.0, 1)])
+
+    def test_failed_book_delete_is_forgotten(self):
+        with mock.patch('django.db.models.deletion.Collector.delete', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.emma.delete()
+            with self.assertRaises(RuntimeError):
+                Book.objects.filter(pk=self.persuasion.pk).delete()
+        # the sales of the books are rolled up again
+        self.sale(self.emma, 1, 1)
+        self.sale(self.persuasion, 2, 1)
+        self.assertEqual(self.rollups(self.emma), [(1, 1, 10.0, 1)])
+        self.assertEqual(self.rollups(self.persuasion), [(1, 2, 20.0, 1)])
+
+    def test_rebuild_command(self):
+        self.sale(self.emma, 1, 1)
+        self.sale(self.emma, 2, 3)
+        # queryset updates bypass the signals, the rebuild repairs the rollups
+        Sale.objects.filter(book=self.emma).update(quantity=5)
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(self.emma), [(1, 5, 10.0, 1), (3, 5, 20.0, 1)])
+
+    def test_grouped_chart_series_matches_raw_sales(self):
+        for day in (1, 1, 2, 9, 20):
+            self.sale(self.emma, day, day)
+        for granularity in ('day', 'week', 'month'):
+            from_rollups = get_chart_series('Emma', granularity)
+            from_sales = get_sales_series(Sale.objects.filter(book=self.emma), granularity)
+            self.assertEqual(list(from_rollups['quantity']), list(from_sales['quantity']))
+            self.assertEqual(list(from_rollups['price']), list(from_sales['price']))
+
+
+class BenchSalesCommandTest(TestCase):
+    def test_seed_and_measure(self):
+        out = StringIO()
+        call_command('bench_sales', seed=True, books=3, sales=40, runs=1, stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())
+        self.assertEqual(results['total_sales'], 40)
+        # every chart type with every granularity
+        self.assertEqual(len(results['scenarios']), 12)
+        scenario = results['scenarios'][0]
+        self.assertEqual(set(scenario['records']), {'p50_ms', 'p95_ms', 'queries', 'peak_memory_kb'})
+        self.assertGreater(scenario['chart_image']['queries'], 0)
+
+    def test_seeded_data_is_the_same_on_every_run(self):
+        def seed():
+            Sale.objects.all().delete()
+            Book.objects.all().delete()
+            call_command('bench_sales', seed=True, books=5, sales=50, runs=1, random_seed=7,
+                         stdout=StringIO(), stderr=StringIO())
+            return list(Sale.objects.order_by('id').values_list('book__name', 'quantity', 'price'))
+        self.assertEqual(seed(), seed())
+
+
+class SqliteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        # 1 is NORMAL; the test database is in memory, so its journal can't be WAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64000)
+
+    def test_export_reads_the_analytics_alias(self):
+        user = get_user_model().objects.create_user(username='tester', password='secret-pass-123')
+        self.client.force_login(user)
+        with override_settings(SALES_ANALYTICS_DB='missing'):
+            with self.assertRaises(ConnectionDoesNotExist):
+                b''.join(self.client.get(reverse('sales:export'), {'book_title': 'Emma'}).streaming_content)
+
+    def test_bench_sqlite(self):
+        out = StringIO()
+        call_command('bench_sqlite', readers=1, duration=0.2, rows=100, batch_size=50, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(set(results['modes']), {'rollback_journal', 'tuned'})
+        self.assertGreater(results['modes']['tuned']['reads'], 0)
+
+
+class TypeaheadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='tester', password='secret-pass-123')
+        for name in ('Emma', 'Emmanuel', 'Persuasion', 'Pride and Prejudice', 'Dracula'):
+            Book.objects.create(name=name, author_name='Author', price=1.0)
+
+    def setUp(self):
+        self.index = TitleIndex()
+
+    def names(self, query):
+        return [name for _, name in self.index.lookup(query)]
+
+    def test_prefix_distance(self):
+        self.assertEqual(prefix_distance('pride', 'pride and prejudice', 2), 0)
+        self.assertEqual(prefix_distance('prdie', 'pride and prejudice', 2), 2)
+        self.assertIsNone(prefix_distance('dracula', 'emma', 2))
+
+    def test_prefix_matches_come_first(self):
+        self.assertEqual(self.names('em')[:2], ['Emma', 'Emmanuel'])
+        self.assertEqual(self.names('  PRIDE '), ['Pride and Prejudice'])
+
+    def test_typos_are_matched(self):
+        self.assertIn('Persuasion', self.names('persausion'))
+        self.assertIn('Dracula', self.names('dracual'))
+
+    def test_short_query_skips_the_typo_search(self):
+        with mock.patch('sales.typeahead.prefix_distance') as distance:
+            self.assertEqual(self.names('zq'), [])
+        distance.assert_not_called()
+
+    def test_typos_are_only_checked_on_candidates(self):
+        for name in ('Dracula', 'Dragon Rider', 'Drums', 'Persuasion', 'Sense and Sensibility'):
+            Book.objects.create(name=name + ' II', author_name='Author', price=1.0)
+        with mock.patch('sales.typeahead.prefix_distance', wraps=prefix_distance) as distance:
+            self.assertEqual(self.names('dracual'), ['Dracula', 'Dracula II'])
+        # titles without pieces of the query in place are never compared
+        compared = {call.args[1] for call in distance.call_args_list}
+        self.assertTrue(compared)
+        self.assertFalse({title for title in compared if not title.startswith('dr')})
+
+    def test_typo_candidates_match_a_full_scan(self):
+        queries = ['persausion', 'prdie and', 'emmma', 'drcula', 'xpersuasion', 'sense adn sens', 'abc']
+        for title in ('Sense and Sensibility', 'Sense of Wonder', 'Pride and Prejudice', 'Emmeline', 'Dracula'):
+            Book.objects.create(name=title, author_name='Author', price=1.0)
+        self.index.load()
+        for query in queries:
+            key = normalize(query)
+            max_distance = min(MAX_EDIT_DISTANCE, len(key) // 3)
+            expected = {
+                pk for normalized, pk, _ in self.index.entries
+                if prefix_distance(key, normalized, max_distance) is not None
+            }
+            with self.subTest(query=query):
+                self.assertTrue(expected <= self.index._fuzzy_candidates(key, max_distance))
+
+    def test_index_follows_book_changes(self):
+        book = Book.objects.create(name='Sense and Sensibility', author_name='Jane Austen', price=1.0)
+        title_index.load()
+        self.assertIn((book.pk, 'Sense and Sensibility'), title_index.lookup('sense'))
+        book.name = 'Mansfield Park'
+        book.save()
+        self.assertEqual(title_index.lookup('sense'), [])
+        self.assertEqual(title_index.lookup('mansf'), [(book.pk, 'Mansfield Park')])
+        book.delete()
+        self.assertEqual(title_index.lookup('mansf'), [])
+
+    def test_titles_endpoint(self):
+        title_index.load()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sales:titles'), {'q': 'drac'})
+        self.assertEqual(response.json()['results'][0]['name'], 'Dracula')
+
+    def test_records_accepts_book_id(self):
+        book = Book.objects.get(name='Dracula')
+        Sale.objects.create(book=book, quantity=1, price=5.0)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('sales:records'), {
+            'book_title': 'dracu', 'book_id': book.pk, 'chart_type': '#1',
+        })
+        self.assertIsNotNone(response.context['page_obj'])
+
+    def test_records_suggests_titles(self):
+        title_index.load()
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('sales:records'), {'book_title': 'Persausion', 'chart_type': '#1'})
+        self.assertContains(response, 'did you mean: Persuasion')
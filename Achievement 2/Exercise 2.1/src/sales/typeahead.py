@@ -0,0 +1,191 @@
+# sales/typeahead.py
+# In-memory index of the book titles for the typeahead of the sales search form.
+# Titles are kept in a sorted array, so a prefix lookup is a binary search;
+# when too few titles share the prefix, titles within a small edit distance are
+# added. Those are only looked for among candidates found in an index of the
+# bigrams at the beginning of the titles (see fuzzy_candidates), outside the
+# lock. The index is loaded on first use and updated by sales/signals.py.
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock
+
+from books.models import Book
+
+# most suggestions returned
+TYPEAHEAD_LIMIT = 10
+
+# typos allowed in a fuzzy match
+MAX_EDIT_DISTANCE = 2
+
+# characters of the query used to find the candidates of a fuzzy match (a title
+# close to the query is close to its first characters as well)
+FUZZY_KEY_LENGTH = 12
+
+# put before a title or query, so its first character is part of a bigram
+START = '\x00'
+
+
+# define a function that puts a title in the form used for comparisons
+def normalize(title):
+    return ' '.join(str(title).casefold().split())
+
+
+# define a function that returns the edit distance between the query and the
+# closest prefix of the title, or None when it is above max_distance
+def prefix_distance(query, title, max_distance):
+    # only prefixes up to max_distance longer than the query can be close enough
+    title = title[:len(query) + max_distance]
+    # previous[j]: edits to turn the query read so far into title[:j]
+    previous = list(range(len(title) + 1))
+    for i, q in enumerate(query, start=1):
+        current = [i]
+        for j, t in enumerate(title, start=1):
+            current.append(min(
+                previous[j] + 1,            # a character missing from the title
+                current[j - 1] + 1,         # an extra character in the title
+                previous[j - 1] + (q != t), # same or swapped character
+            ))
+        if min(current) > max_distance:
+            return None     # no prefix can get close enough any more
+        previous = current
+    distance = min(previous)
+    return distance if distance <= max_distance else None
+
+
+# define a function that returns the (position, bigram) pairs indexed for a normalized title
+def title_grams(title):
+    # a piece of the query can end up to MAX_EDIT_DISTANCE characters further in the title
+    padded = START + title[:FUZZY_KEY_LENGTH + MAX_EDIT_DISTANCE]
+    return {(i, padded[i:i + 2]) for i in range(len(padded) - 1)}
+
+
+class TitleIndex:
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = None     # sorted (normalized title, id, title)
+        self.by_id = {}         # id -> entry
+        self.grams = {}         # (position, bigram) -> ids of the titles having it there
+
+    def load(self):
+        entries = sorted(
+            (normalize(name), pk, name)
+            for pk, name in Book.objects.values_list('id', 'name').iterator(chunk_size=5000)
+        )
+        grams = {}
+        for entry in entries:
+            for gram in title_grams(entry[0]):
+                grams.setdefault(gram, set()).add(entry[1])
+        with self.lock:
+            self.entries = entries
+            self.by_id = {entry[1]: entry for entry in entries}
+            self.grams = grams
+
+    def update(self, pk, name):
+        with self.lock:
+            if self.entries is None:
+                return      # loaded with the change on first use
+            self._remove(pk)
+            entry = (normalize(name), pk, name)
+            insort(self.entries, entry)
+            self.by_id[pk] = entry
+            for gram in title_grams(entry[0]):
+                self.grams.setdefault(gram, set()).add(pk)
+
+    def remove(self, pk):
+        with self.lock:
+            if self.entries is not None:
+                self._remove(pk)
+
+    def _remove(self, pk):
+        entry = self.by_id.pop(pk, None)
+        if entry is not None:
+            index = bisect_left(self.entries, entry)
+            if index < len(self.entries) and self.entries[index] == entry:
+                del self.entries[index]
+            for gram in title_grams(entry[0]):
+                ids = self.grams.get(gram)
+                if ids is not None:
+                    ids.discard(pk)
+                    if not ids:
+                        del self.grams[gram]
+
+    def _fuzzy_candidates(self, key, max_distance):
+        """
+        Return the ids of the titles that may be within max_distance edits of the
+        query (called with the lock held). The query is cut into pieces of 2 or 3
+        characters; an edit spoils one piece at most, so the other pieces are
+        found in the title as they are, at most max_distance characters away
+        from their place in the query.
+        """
+        padded = START + key[:FUZZY_KEY_LENGTH]
+        candidates = None
+        # START begins every title, so a first piece of START and one character
+        # finds many titles; cutting the query a second way, with 2 characters
+        # in the first piece, leaves only the titles that both ways find
+        for first in (2, 3):
+            bounds = [0] + list(range(first, len(padded) - 1, 2)) + [len(padded)]
+            if len(bounds) - 1 <= max_distance:
+                continue    # a piece would be left for sure only with more pieces
+            found = self._pieces_found(padded, bounds, max_distance)
+            candidates = found if candidates is None else candidates & found
+        return candidates
+
+    def _pieces_found(self, padded, bounds, max_distance):
+        """Return the ids of the titles in which enough pieces of the query are found."""
+        matches = Counter()
+        for start, end in zip(bounds, bounds[1:]):
+            found = set()
+            for position in range(max(start - max_distance, 0), start + max_distance + 1):
+                # the titles with every bigram of the piece in place
+                postings = sorted(
+                    (self.grams.get((position + i, padded[start + i:start + i + 2]), set())
+                     for i in range(end - start - 1)),
+                    key=len,
+                )
+                found |= postings[0].intersection(*postings[1:])
+            matches.update(found)
+        # max_distance edits spoil as many pieces at most
+        needed = len(bounds) - 1 - max_distance
+        return {pk for pk, count in matches.items() if count >= needed}
+
+    def lookup(self, query, limit=TYPEAHEAD_LIMIT):
+        """Return up to limit (id, title) pairs: prefix matches, then close titles."""
+        if self.entries is None:
+            self.load()
+        key = normalize(query)
+        if not key:
+            return []
+
+        # a query of less than 3 characters is too short to allow typos
+        max_distance = min(MAX_EDIT_DISTANCE, len(key) // 3)
+        candidates = []
+        with self.lock:
+            results = []
+            start = bisect_left(self.entries, (key,))
+            for entry in self.entries[start:start + limit]:
+                if not entry[0].startswith(key):
+                    break
+                results.append(entry)
+
+            if len(results) < limit and max_distance:
+                found = {entry[1] for entry in results}
+                candidates = [self.by_id[pk] for pk in self._fuzzy_candidates(key, max_distance) - found]
+
+        if candidates:
+            # typos: titles whose beginning is a few edits away from the query;
+            # many titles begin alike, each beginning is compared once
+            distances = {}
+            close = []
+            for entry in candidates:
+                beginning = entry[0][:len(key) + max_distance]
+                if beginning not in distances:
+                    distances[beginning] = prefix_distance(key, beginning, max_distance)
+                if distances[beginning] is not None:
+                    close.append((distances[beginning], entry))
+            close.sort()
+            results += [entry for _, entry in close[:limit - len(results)]]
+
+        return [(pk, name) for _, pk, name in results]
+
+
+title_index = TitleIndex()
@@ -1,10 +1,13 @@
 # sales/urls.py
 from django.urls import path
-from .views import home, records
+from .views import chart, export_records, home, records, titles
 
 app_name = 'sales'
 
 urlpatterns = [
     path('', home, name='home'),
     path('sales/', records, name='records'),
+    path('sales/chart/', chart, name='chart'),
+    path('sales/export/', export_records, name='export'),
+    path('sales/titles/', titles, name='titles'),
 ]
\ No newline at end of file
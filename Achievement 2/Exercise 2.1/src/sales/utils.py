@@ -1,7 +1,50 @@
 from books.models import Book   # you need to connect parameters from books model
+from bookstore.profiling import timed
+from .models import Sale, SaleDailyRollup
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
+from collections import OrderedDict
+from datetime import datetime, timezone
 from io import BytesIO 
+from threading import Lock
 import base64
-import matplotlib.pyplot as plt
+import hashlib
+import time
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import pandas as pd
+
+# the chart never gets more points than this, whatever the size of the result
+MAX_CHART_POINTS = 5000
+
+# how many book names are remembered between requests
+BOOKNAME_CACHE_SIZE = 1024
+
+# seconds a book name is trusted: the signals only clear the cache of the
+# process that saved the book, so other workers see a rename after this
+BOOKNAME_CACHE_TTL = 30
+
+# process-local LRU of book id -> (book name, expiry), most recently used last
+_bookname_cache = OrderedDict()
+_bookname_lock = Lock()
+
+# name of the cache (see CACHES in settings) holding the rendered charts
+CHART_CACHE_ALIAS = 'charts'
+
+# chart image formats that can be requested -> content type of the response
+CHART_CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# granularity (from SalesSearchForm) -> database function used to bucket sales
+TRUNC_FUNCTIONS = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
 
 
 # define a function that takes the ID
@@ -12,12 +55,185 @@ def get_bookname_from_id(val):
     return bookname
 
 
-def get_graph():
+# define a function that takes many IDs and returns a {id: name} dictionary
+def get_booknames_from_ids(ids):
+    names = {}
+    missing = []
+
+    # serve the hot titles from the cache first
+    now = time.monotonic()
+    with _bookname_lock:
+        for book_id in set(ids):
+            cached = _bookname_cache.get(book_id)
+            if cached is not None and cached[1] > now:
+                _bookname_cache.move_to_end(book_id)
+                names[book_id] = cached[0]
+            else:
+                missing.append(book_id)
+
+    if missing:
+        # resolve everything that is left with a single query
+        found = dict(Book.objects.filter(id__in=missing).values_list('id', 'name'))
+        names.update(found)
+
+        expires = now + BOOKNAME_CACHE_TTL
+        with _bookname_lock:
+            for book_id, name in found.items():
+                _bookname_cache[book_id] = (name, expires)
+                _bookname_cache.move_to_end(book_id)
+            # drop the least recently used names
+            while len(_bookname_cache) > BOOKNAME_CACHE_SIZE:
+                _bookname_cache.popitem(last=False)
+
+    return names
+
+
+# define a function that removes a book from the name cache (e.g. after a rename)
+def forget_bookname(book_id):
+    with _bookname_lock:
+        _bookname_cache.pop(book_id, None)
+
+
+# the cache keys are built from a digest, so any title is a valid key
+def _title_digest(book_title):
+    return hashlib.sha1(str(book_title).encode('utf-8')).hexdigest()
+
+
+# define a function that returns the data version of a book's sales
+def get_chart_version(book_title):
+    cache = caches[CHART_CACHE_ALIAS]
+    key = f'sales:chart-version:{_title_digest(book_title)}'
+    # start from the clock, so a version that was evicted never comes back
+    # with a number that old charts were cached under
+    started = time.time_ns()
+    if cache.add(key, started, timeout=None):
+        return started
+    version = cache.get(key)
+    # evicted between the add and the get: the clock is as good a version
+    return started if version is None else version
+
+
+# define a function that makes every cached chart of a book stale
+def bump_chart_version(book_title):
+    cache = caches[CHART_CACHE_ALIAS]
+    key = f'sales:chart-version:{_title_digest(book_title)}'
+    # the version is the time of the last change (in ns), always moving forward
+    current = cache.get(key) or 0
+    cache.set(key, max(time.time_ns(), current + 1), timeout=None)
+
+
+# define a function that returns when the sales of a book last changed
+def get_chart_last_modified(book_title):
+    return datetime.fromtimestamp(get_chart_version(book_title) / 1e9, tz=timezone.utc)
+
+
+# define a function that returns the cache key of a chart at the current data version
+# book_id: the chart only shows the sales of this book (not all books with that title)
+def get_chart_cache_key(book_title, chart_type, granularity, fmt='png', book_id=None):
+    version = get_chart_version(book_title)
+    book = book_id if book_id is not None else 'title'
+    return f'sales:chart:{_title_digest(book_title)}:{book}:{chart_type}:{granularity or "raw"}:{fmt}:{version}'
+
+
+# define a function that returns a chart from the cache, or renders and stores it
+# render: function without arguments that returns the chart
+def get_cached_chart(book_title, chart_type, granularity, render, fmt='png', book_id=None):
+    cache = caches[CHART_CACHE_ALIAS]
+    key = get_chart_cache_key(book_title, chart_type, granularity, fmt, book_id)
+
+    chart = cache.get(key)
+    if chart is None:
+        chart = render()
+        cache.set(key, chart)
+    return chart
+
+
+# granularity -> expression bucketing the days of SaleDailyRollup
+ROLLUP_PERIODS = {
+    'day': F('day'),
+    'week': TruncWeek('day'),
+    'month': TruncMonth('day'),
+}
+
+
+# define a function that returns the database alias of the analytics (read-only) queries
+def get_analytics_db():
+    return getattr(settings, 'SALES_ANALYTICS_DB', 'default')
+
+
+# define a function that returns the series to plot for a book
+# grouped charts are read from the daily rollups, which stay small as sales grow
+# book_id: only this book, instead of every book titled book_title
+def get_chart_series(book_title, granularity=None, book_id=None):
+    db = get_analytics_db()
+    book = {'book_id': book_id} if book_id is not None else {'book__name': book_title}
+    if granularity in ROLLUP_PERIODS:
+        return get_rollup_series(SaleDailyRollup.objects.using(db).filter(**book), granularity)
+    return get_sales_series(Sale.objects.using(db).filter(**book), granularity)
+
+
+# qs: queryset of daily rollups, granularity: one of ROLLUP_PERIODS
+def get_rollup_series(qs, granularity):
+    rows = (
+        qs.order_by()
+        .annotate(period=ROLLUP_PERIODS[granularity])
+        .values('period')
+        .annotate(total_quantity=Sum('total_quantity'), total_price=Sum('total_revenue'))
+        .order_by('period')
+    )[:MAX_CHART_POINTS]
+    return _series_frame(rows)
+
+
+# turns bucketed rows into the dataframe the charts expect
+def _series_frame(rows):
+    rows = [
+        {'date_created': row['period'],
+         'quantity': row['total_quantity'],
+         'price': row['total_price']}
+        for row in rows
+    ]
+    return pd.DataFrame(rows, columns=['date_created', 'quantity', 'price'])
+
+
+# qs: queryset of sales, granularity: user input on how to group the sales
+def get_sales_series(qs, granularity=None):
+    # columns the charts need, named the same way in both modes
+    columns = ['date_created', 'quantity', 'price']
+    trunc = TRUNC_FUNCTIONS.get(granularity)
+
+    if trunc is None:
+        # no grouping: take the most recent sales only and put them back in order
+        rows = qs.order_by('-date_created').values(*columns)[:MAX_CHART_POINTS]
+        rows = list(rows)[::-1]
+    else:
+        # let the database sum quantity and price per bucket,
+        # so only one row per day/week/month leaves the database
+        rows = (
+            qs.order_by()
+            .annotate(period=trunc('date_created'))
+            .values('period')
+            .annotate(total_quantity=Sum('quantity'), total_price=Sum('price'))
+            .order_by('period')
+        )[:MAX_CHART_POINTS]
+        return _series_frame(rows)
+
+    return pd.DataFrame(rows, columns=columns)
+
+
+# fig: the Figure to save,
+# output: optional file-like object (e.g. a BytesIO) to write the image into,
+# fmt: image format, one of CHART_CONTENT_TYPES
+def get_graph(fig, output=None, fmt='png'):
+    if output is not None:
+        # write the image straight into the output, no base64 round trip
+        fig.savefig(output, format=fmt)
+        return output
+
     # create a BytesIO buffer for the image
     buffer = BytesIO()         
 
-    # create a plot with a bytesIO object as a file-like object. Set format to png
-    plt.savefig(buffer, format='png')
+    # save the figure with a bytesIO object as a file-like object
+    fig.savefig(buffer, format=fmt)
 
     # set cursor to the beginning of the stream
     buffer.seek(0)
@@ -39,35 +255,52 @@ def get_graph():
 
 
 # chart_type: user input on type of chart,
-# data: pandas dataframe
-def get_chart(chart_type, data, **kwargs):
-    # switch plot backend to AGG (Anti-Grain Geometry) - to write to file
-    # AGG is preferred solution to write PNG files
-    plt.switch_backend('AGG')
-
-    # specify figure size
-    fig = plt.figure(figsize=(6, 3))
-
-    # select chart_type based on user input from the form
-    if chart_type == '#1':
-        # plot bar chart between date on x-axis and quantity on y-axis
-        plt.bar(data['date_created'], data['quantity'])
-
-    elif chart_type == '#2':
-        # generate pie chart based on the price.
-        # The book titles are sent from the view as labels
-        labels = kwargs.get('labels')
-        plt.pie(data['price'], labels=labels)
-
-    elif chart_type == '#3':
-        # plot line chart based on date on x-axis and price on y-axis
-        plt.plot(data['date_created'], data['price'])
-    else:
-        print('unknown chart type')
+# data: pandas dataframe,
+# output and fmt: passed on to get_graph
+def get_chart(chart_type, data, output=None, fmt='png', **kwargs):
+    # every request gets its own Figure drawn by its own AGG (Anti-Grain Geometry)
+    # canvas; nothing goes through the global pyplot state, so concurrent
+    # requests in threaded workers cannot draw into each other's charts
+    fig = Figure(figsize=(6, 3))
+    FigureCanvasAgg(fig)
+
+    # counted as chart time when the request is profiled
+    with timed('chart'):
+        try:
+            ax = fig.add_subplot()
 
-    # specify layout details
-    plt.tight_layout()
+            # select chart_type based on user input from the form
+            if chart_type == '#1':
+                # plot bar chart between date on x-axis and quantity on y-axis
+                ax.bar(data['date_created'], data['quantity'])
+
+            elif chart_type == '#2':
+                # generate pie chart based on the price.
+                # The book titles are sent from the view as labels
+                labels = kwargs.get('labels')
+                ax.pie(data['price'], labels=labels)
+
+            elif chart_type == '#3':
+                # plot line chart based on date on x-axis and price on y-axis
+                ax.plot(data['date_created'], data['price'])
+            else:
+                print('unknown chart type')
+
+            # specify layout details
+            fig.tight_layout()
+
+            # render the graph to file
+            chart = get_graph(fig, output, fmt)
+        finally:
+            # drop everything drawn on the figure, so no memory is held after the request
+            fig.clear()
 
-    # render the graph to file
-    chart = get_graph() 
     return chart
+
+
+# define a function that returns the image bytes of a chart
+# (top-level, so it can also run in the chart worker processes)
+def render_chart_image(chart_type, data, fmt='png'):
+    buffer = BytesIO()
+    get_chart(chart_type, data, output=buffer, fmt=fmt, labels=data['date_created'].values)
+    return buffer.getvalue()
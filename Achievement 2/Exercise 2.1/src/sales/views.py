@@ -1,11 +1,34 @@
 # sales/views.py
+from django.conf import settings
 from django.shortcuts import render
 # to protect function-based views
 from django.contrib.auth.decorators import login_required
-from .forms import SalesSearchForm
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_GET
+from books.models import Book
+from .forms import CHART__CHOICES, GRANULARITY__CHOICES, SalesSearchForm
 from .models import Sale
+import csv
+import logging
 import pandas as pd
-from .utils import get_bookname_from_id, get_chart
+from .utils import (
+    CHART_CONTENT_TYPES, get_analytics_db, get_booknames_from_ids, get_cached_chart,
+    get_chart_last_modified, get_chart_series, get_chart_version, render_chart_image,
+)
+from .typeahead import title_index
+from .workers import submit_chart, wait_for_chart
+
+logger = logging.getLogger(__name__)
+
+# number of raw sales shown per page of the records table (unless chosen in the form)
+RECORDS_PER_PAGE = 50
+
+# rows fetched from the database at a time by the CSV export
+EXPORT_CHUNK_SIZE = 2000
 
 def home(request):
     """
@@ -20,40 +43,213 @@ def home(request):
 # keep protected
 @login_required
 def records(request):
+    # a search is POSTed by the form; the paging and export links repeat it with GET
+    data = request.POST or request.GET or None
     # create an instance of SalesSearchForm that you defined in sales/forms.py
-    form = SalesSearchForm(request.POST or None)
+    form = SalesSearchForm(data)
     sales_df = None   # initialize dataframe to None
-    chart = None      # initialize chart to None
+    chart_url = None  # initialize chart URL to None
+    page_obj = None   # initialize table page to None
+    search_query = None   # initialize query string of the search to None
+    suggestions = None    # initialize titles suggested for an unknown book to None
     
-    # check if the button is clicked
-    if request.method == 'POST':
+    # check if a search was sent
+    if data is not None and form.is_valid():
         # read book_title and chart_type
-        book_title = request.POST.get('book_title')
-        chart_type = request.POST.get('chart_type')
+        book_title = form.cleaned_data['book_title']
+        book_id = form.cleaned_data['book_id']
+        chart_type = form.cleaned_data['chart_type']
+        granularity = form.cleaned_data['granularity']
+        size = form.cleaned_data['size'] or RECORDS_PER_PAGE
         
-        # display in terminal - needed for debugging during development only
-        print(book_title, chart_type)
+        # shown only when debug logging is on for this module
+        logger.debug('records search: %s %s %s', book_title, chart_type, granularity)
         
         # apply filter to extract data
-        qs = Sale.objects.filter(book__name=book_title)
-        if qs:      # if data found
-            # convert the queryset values to pandas dataframe
-            sales_df = pd.DataFrame(qs.values())
-            # convert the ID to Name of book
-            sales_df['book_id'] = sales_df['book_id'].apply(get_bookname_from_id)
+        if book_id is not None:
+            # a book picked in the typeahead comes with its id: only its sales
+            # are shown, even if other books have the same title, under the
+            # title on record (read here, not from the name cache of this process)
+            book_title = Book.objects.filter(pk=book_id).values_list('name', flat=True).first() or book_title
+            qs = Sale.objects.filter(book_id=book_id)
+        else:
+            qs = Sale.objects.filter(book__name=book_title)
+        # the book picked, for the chart and the paging and export links
+        book = {'book_id': book_id} if book_id is not None else {}
+        if not qs.exists():
+            # no such title: offer the closest ones instead of "no data" only
+            suggestions = [name for _, name in title_index.lookup(book_title)]
+        else:      # if data found
+            # the chart is a separate, cacheable image; the version in the URL
+            # changes whenever the sales of the book change
+            chart_url = reverse('sales:chart') + '?' + urlencode({
+                'book_title': book_title,
+                'chart_type': chart_type,
+                'granularity': granularity,
+                **book,
+                'v': get_chart_version(book_title),
+            })
+            # with chart workers enabled, rendering starts now in the background
+            # and the page does not wait for it
+            submit_chart(book_title, chart_type, granularity, book_id=book_id)
             
-            # call get_chart by passing chart_type from user input, sales dataframe and labels
-            chart = get_chart(chart_type, sales_df, labels=sales_df['date_created'].values)
+            # the table only loads the raw sales of the requested page
+            paginator = Paginator(qs.order_by('date_created', 'id').values(), size)
+            page_obj = paginator.get_page(form.cleaned_data['page'])
+
+            # convert the page of sales to pandas dataframe
+            sales_df = pd.DataFrame(list(page_obj))
+            # convert the ID to Name of book, resolving all IDs in one go
+            booknames = get_booknames_from_ids(sales_df['book_id'].unique().tolist())
+            sales_df['book_id'] = sales_df['book_id'].map(booknames)
             
             # convert the dataframe to HTML
             sales_df = sales_df.to_html()
+
+            # the search without its page, for the paging and export links
+            search_query = urlencode({
+                'book_title': book_title,
+                'chart_type': chart_type,
+                'granularity': granularity,
+                'size': size,
+                **book,
+            })
     
     # pack up data to be sent to template in the context dictionary
     context = {
         'form': form,
         'sales_df': sales_df,
-        'chart': chart
+        'chart_url': chart_url,
+        'page_obj': page_obj,
+        'search_query': search_query,
+        'suggestions': suggestions
     }
     
     # load the sales/record.html page using the data that you just prepared
-    return render(request, 'sales/records.html', context)
\ No newline at end of file
+    return render(request, 'sales/records.html', context)
+
+
+# define function-based view - titles(request)
+# returns the book titles matching ?q= for the typeahead, keep protected
+@login_required
+@require_GET
+def titles(request):
+    matches = title_index.lookup(request.GET.get('q', ''))
+    return JsonResponse({'results': [{'id': pk, 'name': name} for pk, name in matches]})
+
+
+# pseudo-buffer for csv.writer: hands every written line back instead of storing it
+class Echo:
+    def write(self, value):
+        return value
+
+
+# define function-based view - export_records(request)
+# streams every sale of a book as CSV, keep protected
+@login_required
+@require_GET
+def export_records(request):
+    book_title = request.GET.get('book_title')
+    book_id = get_book_id(request)
+    book = {'book_id': book_id} if book_id is not None else {'book__name': book_title}
+
+    # only the columns of the export, read from the database in chunks
+    rows = (
+        Sale.objects.using(get_analytics_db())
+        .filter(**book)
+        .order_by('date_created', 'id')
+        .values_list('id', 'book__name', 'quantity', 'price', 'date_created')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(['id', 'book', 'quantity', 'price', 'date_created'])
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="sales.csv"'
+    return response
+
+
+# define a function that returns the book_id of a chart or export link, if any
+def get_book_id(request):
+    book_id = request.GET.get('book_id')
+    if not book_id:
+        return None
+    try:
+        return int(book_id)
+    except ValueError:
+        raise Http404('unknown book')
+
+
+# define a function that returns the validated parameters of a chart request,
+# or None when they name no chart
+def get_chart_params(request):
+    params = request.GET
+    chart_type = params.get('chart_type')
+    granularity = params.get('granularity') or ''
+    fmt = params.get('format', 'png')
+    # only known chart types, groupings and image formats are rendered
+    if (chart_type not in dict(CHART__CHOICES) or granularity not in dict(GRANULARITY__CHOICES)
+            or fmt not in CHART_CONTENT_TYPES):
+        return None
+    try:
+        book_id = get_book_id(request)
+    except Http404:
+        return None
+    return {
+        'book_title': params.get('book_title'),
+        'chart_type': chart_type,
+        'granularity': granularity,
+        'fmt': fmt,
+        'book_id': book_id,
+    }
+
+
+# ETag and Last-Modified of a chart only need the data version, not the data;
+# the ETag is built from validated parameters only, so it is a valid header
+def chart_etag(request):
+    params = get_chart_params(request)
+    if params is None:
+        return None     # the view answers 404
+    version = get_chart_version(params['book_title'])
+    return f"{version}-{params['book_id']}-{params['chart_type']}-{params['granularity']}-{params['fmt']}"
+
+
+def chart_last_modified(request):
+    return get_chart_last_modified(request.GET.get('book_title'))
+
+
+# define function-based view - chart(request)
+# streams the chart image of the records page, keep protected
+@login_required
+@require_GET
+@condition(etag_func=chart_etag, last_modified_func=chart_last_modified)
+def chart(request):
+    params = get_chart_params(request)
+    if params is None:
+        raise Http404('unknown chart')
+    book_title = params['book_title']
+    chart_type = params['chart_type']
+    granularity = params['granularity']
+    fmt = params['fmt']
+    book_id = params['book_id']
+
+    def render_chart():
+        # a chart handed to the worker pool by the records page is picked up here
+        image = wait_for_chart(book_title, chart_type, granularity, fmt, book_id=book_id)
+        if image is None:
+            # grouped charts come from the daily rollups, the others from the capped raw sales
+            chart_df = get_chart_series(book_title, granularity, book_id)
+            # draw the raw image bytes, no base64 round trip
+            image = render_chart_image(chart_type, chart_df, fmt)
+        return image
+
+    image = get_cached_chart(book_title, chart_type, granularity, render_chart, fmt, book_id)
+    response = HttpResponse(image, content_type=CHART_CONTENT_TYPES[fmt])
+
+    # the URL carries the data version, so browsers may keep the image for a while
+    patch_cache_control(response, private=True, max_age=settings.CHART_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,138 @@
+# sales/workers.py
+# Optional pool of processes rendering sales charts off the request thread.
+# Enabled with SALES_CHART_WORKERS (number of processes) in settings.
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+# sales.utils is imported inside the functions below: worker processes load this
+# module before Django is set up, and sales.utils needs the models
+
+# how many charts may wait for a worker per worker process; the image
+# endpoint renders inline when the pool is this busy
+MAX_PENDING_PER_WORKER = 4
+
+_executor = None
+_pending = {}       # chart cache key -> Future of the image bytes
+_lock = Lock()
+
+
+def _warm_worker():
+    # runs once in every worker process: set up Django and import the
+    # rendering engine (and with it matplotlib) before the first chart
+    import django
+    django.setup()
+    from . import utils  # noqa: F401
+
+
+def _ready():
+    # submitted once per worker so the processes start with the pool
+    return True
+
+
+# define a function that returns the chart pool, or None when it is disabled
+def get_executor():
+    global _executor
+    workers = getattr(settings, 'SALES_CHART_WORKERS', 0)
+    if not workers:
+        return None
+
+    with _lock:
+        if _executor is None:
+            # spawn instead of fork: forking a threaded web server is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context('spawn'),
+                initializer=_warm_worker,
+            )
+            for _ in range(workers):
+                _executor.submit(_ready)
+    return _executor
+
+
+# define a function that stops the pool (e.g. at the end of the tests)
+def shutdown_executor():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+        _pending.clear()
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _forward(future, worker):
+    # hands the outcome of the worker to the Future reserved by submit_chart
+    if worker.cancelled():
+        future.cancel()
+    elif worker.exception() is not None:
+        future.set_exception(worker.exception())
+    else:
+        future.set_result(worker.result())
+
+
+def _store(key, future):
+    # called when a worker is done: keep the image in the chart cache
+    # before the chart stops being pending, so it is never submitted twice
+    if not future.cancelled() and future.exception() is None:
+        from .utils import CHART_CACHE_ALIAS
+        caches[CHART_CACHE_ALIAS].set(key, future.result())
+    with _lock:
+        _pending.pop(key, None)
+
+
+# parameters as in the chart view
+# returns the Future of the image, or None when nothing was submitted
+def submit_chart(book_title, chart_type, granularity, fmt='png', book_id=None):
+    executor = get_executor()
+    if executor is None:
+        return None
+
+    from .utils import CHART_CACHE_ALIAS, get_chart_cache_key, get_chart_series, render_chart_image
+    key = get_chart_cache_key(book_title, chart_type, granularity, fmt, book_id)
+    if caches[CHART_CACHE_ALIAS].get(key) is not None:
+        return None     # already rendered
+
+    with _lock:
+        if key in _pending:
+            return _pending[key]
+        if len(_pending) >= MAX_PENDING_PER_WORKER * settings.SALES_CHART_WORKERS:
+            return None
+        # the chart is reserved before the lock is released, so two requests
+        # never both submit it; the series is loaded after, without the lock
+        future = Future()
+        _pending[key] = future
+    future.add_done_callback(partial(_store, key))
+
+    try:
+        # the (bucketed) series is loaded here; the worker only draws
+        data = get_chart_series(book_title, granularity, book_id)
+        worker = executor.submit(render_chart_image, chart_type, data, fmt)
+    except Exception as e:
+        # the chart is not pending anymore; waiters render it inline
+        future.set_exception(e)
+        raise
+    worker.add_done_callback(partial(_forward, future))
+    return future
+
+
+# define a function that waits for a chart submitted by submit_chart
+# returns the image bytes, or None when that chart is not in the pool
+def wait_for_chart(book_title, chart_type, granularity, fmt='png', timeout=None, book_id=None):
+    from .utils import get_chart_cache_key
+    key = get_chart_cache_key(book_title, chart_type, granularity, fmt, book_id)
+    with _lock:
+        future = _pending.get(key)
+    if future is None:
+        return None
+
+    if timeout is None:
+        timeout = getattr(settings, 'SALES_CHART_WAIT', 30)
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        # the worker failed or is too slow, the caller renders inline
+        return None
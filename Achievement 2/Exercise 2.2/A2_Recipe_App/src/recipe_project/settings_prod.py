@@ -67,10 +67,30 @@ WSGI_APPLICATION = 'recipe_project.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 # For real production, consider PostgreSQL/MySQL. SQLite kept for simplicity.
 
+# SQLite tuning, run on every new connection: WAL lets readers go on while
+# a writer commits, and writers wait busy_timeout ms for the lock
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,   # in KiB
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # writers take the lock when the transaction begins instead of
+            # failing when a read lock can't be upgraded
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # reuse connections across requests
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -105,6 +125,9 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# thumbnails of recipe pictures are made in a background thread (recipes/images.py)
+IMAGE_DERIVATIVES_ASYNC = True
+
 
 # Security settings for production
 SECURE_SSL_REDIRECT = os.environ.get('DJANGO_SECURE_SSL_REDIRECT', 'false').lower() == 'true'
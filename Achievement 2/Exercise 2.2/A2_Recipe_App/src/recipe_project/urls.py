@@ -1,7 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings_local
-from django.conf import settings_pord
+from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
@@ -9,7 +8,5 @@ urlpatterns = [
     path('', include('recipes.urls')),
 ]
 
-if settings_local.DEBUG:
-    urlpatterns += static(settings_local.MEDIA_URL, document_root=settings_local.MEDIA_ROOT)
-    urlpatterns += static(settings_production.MEDIA_URL, document_root=settings_prod.9MEDIA_ROOT)
-
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -8,7 +8,9 @@ class RecipeAdmin(admin.ModelAdmin):
 		return obj.difficulty()
 
 	difficulty_display.short_description = "Difficulty"
+	# sorted and filtered on the stored, indexed column
+	difficulty_display.admin_order_field = "difficulty_level"
 
-	list_display = ("name", "cooking_time", "difficulty_display")
+	list_display = ("name", "cooking_time", "ingredient_count", "difficulty_display")
 	search_fields = ("name", "ingredients")
-	list_filter = ("cooking_time",)
+	list_filter = ("cooking_time", "difficulty_level", "ingredient_count")
@@ -0,0 +1,96 @@
+"""Thumbnails and WebP variants of the recipe pictures (Recipe.pic).
+
+Every picture gets width-bounded thumbnails in its own format and in WebP,
+stored next to the original under MEDIA_ROOT:
+
+    recipes/soup.jpg -> recipes/soup.w150.jpg, recipes/soup.w150.webp, ...
+
+They are made with Pillow on a small thread pool when a recipe is saved with a
+new picture (see recipes/signals.py), the same way as the pictures of the
+bookstore project (bookstore/images.py there).
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# widths (in pixels) of the thumbnails; wider than the original are skipped
+THUMBNAIL_WIDTHS = (150, 300, 600)
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='recipe-thumbnails')
+
+
+def derivative_name(name: str, width: int, fmt: str | None = None) -> str:
+	"""Name of the ``width`` thumbnail of ``name``; ``fmt='webp'`` for the WebP one."""
+	root, ext = posixpath.splitext(name)
+	return f'{root}.w{width}{"." + fmt if fmt else ext}'
+
+
+def generate_derivatives(name: str, storage=default_storage) -> list[str]:
+	"""Write the missing thumbnails of the picture ``name``; return their names."""
+	missing = {
+		(width, fmt) for width in THUMBNAIL_WIDTHS for fmt in (None, 'webp')
+		if not storage.exists(derivative_name(name, width, fmt))
+	}
+	if not missing:
+		return []
+
+	created = []
+	with storage.open(name, 'rb') as f:
+		# only the header is read here; the pixels are decoded by the first resize
+		original = Image.open(f)
+		for width in THUMBNAIL_WIDTHS:
+			if width >= original.width:
+				break
+			height = round(original.height * width / original.width)
+			thumbnail = None
+			for fmt in (None, 'webp'):
+				if (width, fmt) not in missing:
+					continue
+				if thumbnail is None:
+					thumbnail = original.resize((width, height), Image.Resampling.LANCZOS)
+				content = ContentFile(_encode(thumbnail, fmt or original.format))
+				created.append(storage.save(derivative_name(name, width, fmt), content))
+	return created
+
+
+def _encode(image, fmt: str) -> bytes:
+	buffer = BytesIO()
+	fmt = fmt.upper()
+	if fmt == 'WEBP':
+		image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+	elif fmt in ('JPEG', 'JPG'):
+		image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+	else:
+		image.save(buffer, fmt, optimize=True)
+	return buffer.getvalue()
+
+
+def _generate_logged(name: str) -> list[str]:
+	try:
+		return generate_derivatives(name)
+	except Exception:
+		logger.exception('could not generate the thumbnails of %s', name)
+		return []
+
+
+def schedule_derivatives(name: str):
+	"""Generate the thumbnails of ``name`` in the background (or right away when
+	IMAGE_DERIVATIVES_ASYNC is False). Returns a Future, or the created names.
+	"""
+	# the default picture may not be on disk (e.g. in a fresh checkout)
+	if not name or not default_storage.exists(name):
+		return None
+	if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+		return _executor.submit(_generate_logged, name)
+	return _generate_logged(name)
@@ -0,0 +1,25 @@
+"""Parsing and canonical names of the comma-separated ingredients of a recipe.
+
+Kept free of model imports so migrations can use it too.
+"""
+import re
+
+_SPACES = re.compile(r'\s+')
+
+
+def parse_ingredients(csv: str) -> list[str]:
+	"""Split a comma-separated ingredients string into stripped, non-empty items."""
+	if not csv:
+		return []
+	return [item.strip() for item in csv.split(',') if item.strip()]
+
+
+def normalize_ingredient(name: str) -> str:
+	"""Canonical form of an ingredient name: lower case, single spaces."""
+	return _SPACES.sub(' ', name.strip()).lower()
+
+
+def canonical_ingredients(csv: str) -> list[str]:
+	"""Canonical names of the ingredients in ``csv``, in order, without repeats."""
+	# dict keys keep the first occurrence of each name, in linear time
+	return list(dict.fromkeys(normalize_ingredient(item) for item in parse_ingredients(csv)))
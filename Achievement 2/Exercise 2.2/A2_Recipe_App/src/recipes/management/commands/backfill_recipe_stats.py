@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, compute_difficulty
+from recipes.ingredients import parse_ingredients
+
+
+class Command(BaseCommand):
+	"""Fill Recipe.ingredient_count and Recipe.difficulty_level for existing recipes.
+
+	Recipes saved since the columns were added are up to date already; only the
+	rows whose stored values differ are written.
+	"""
+
+	help = 'Compute the stored ingredient count and difficulty of every recipe'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help='rows per UPDATE batch (default: 1000)')
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+		changed = []
+		updated = 0
+		rows = Recipe.objects.only('id', 'cooking_time', 'ingredients', 'ingredient_count', 'difficulty_level')
+		for recipe in rows.iterator(chunk_size=batch_size):
+			count = len(parse_ingredients(recipe.ingredients))
+			difficulty = compute_difficulty(recipe.cooking_time, count)
+			if (recipe.ingredient_count, recipe.difficulty_level) == (count, difficulty):
+				continue
+			recipe.ingredient_count = count
+			recipe.difficulty_level = difficulty
+			changed.append(recipe)
+			if len(changed) >= batch_size:
+				updated += Recipe.objects.bulk_update(changed, ['ingredient_count', 'difficulty_level'])
+				changed = []
+		if changed:
+			updated += Recipe.objects.bulk_update(changed, ['ingredient_count', 'difficulty_level'])
+
+		self.stdout.write(self.style.SUCCESS(f'Updated {updated} recipes'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_remove_recipe_ingredients_delete_ingredient_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='pic',
+            field=models.ImageField(default='no_picture.jpg', upload_to='recipes'),
+        ),
+    ]
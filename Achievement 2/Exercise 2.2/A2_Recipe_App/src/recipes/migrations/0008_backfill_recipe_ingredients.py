@@ -0,0 +1,47 @@
+# Fills Ingredient and RecipeIngredient from the comma-separated Recipe.ingredients
+
+from django.db import migrations
+
+from recipes.ingredients import canonical_ingredients
+
+BATCH_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+
+    # same parsing as Recipe.ingredients_list(), then the canonical names
+    parsed = {
+        recipe_id: canonical_ingredients(csv)
+        for recipe_id, csv in Recipe.objects.values_list('id', 'ingredients').iterator()
+    }
+    names = {name for recipe_names in parsed.values() for name in recipe_names}
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name) for name in sorted(names)], batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    ids = dict(Ingredient.objects.values_list('name', 'id'))
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id, ingredient_id=ids[name], position=position)
+         for recipe_id, recipe_names in parsed.items()
+         for position, name in enumerate(recipe_names)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def clear(apps, schema_editor):
+    apps.get_model('recipes', 'RecipeIngredient').objects.all().delete()
+    apps.get_model('recipes', 'Ingredient').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_ingredient_recipeingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
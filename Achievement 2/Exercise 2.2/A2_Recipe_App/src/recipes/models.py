@@ -1,4 +1,73 @@
 from django.db import models
+from django.db.models import Count
+
+from .ingredients import canonical_ingredients, normalize_ingredient, parse_ingredients
+
+
+class Ingredient(models.Model):
+	"""An ingredient, by canonical name (see recipes.ingredients.normalize_ingredient)."""
+
+	# unique, so looking an ingredient up by name is an index seek
+	name = models.CharField(max_length=80, unique=True)
+
+	class Meta:
+		ordering = ['name']
+
+	def __str__(self) -> str:
+		return self.name
+
+
+DIFFICULTY_CHOICES = [
+	('Easy', 'Easy'),
+	('Medium', 'Medium'),
+	('Intermediate', 'Intermediate'),
+	('Hard', 'Hard'),
+]
+
+
+def compute_difficulty(cooking_time: int, num_ingredients: int) -> str:
+	"""Difficulty from cooking time and number of ingredients.
+
+	Easy: cooking_time < 10 and ingredients < 4
+	Medium: cooking_time < 10 and ingredients >= 4
+	Intermediate: cooking_time >= 10 and ingredients < 4
+	Hard: otherwise
+	"""
+	if cooking_time < 10 and num_ingredients < 4:
+		return 'Easy'
+	if cooking_time < 10 and num_ingredients >= 4:
+		return 'Medium'
+	if cooking_time >= 10 and num_ingredients < 4:
+		return 'Intermediate'
+	return 'Hard'
+
+
+class RecipeQuerySet(models.QuerySet):
+	"""Ingredient matches as joins on the indexed RecipeIngredient table."""
+
+	def _with_ingredients(self, names):
+		names = {normalize_ingredient(name) for name in names}
+		return names, RecipeIngredient.objects.filter(ingredient__name__in=names)
+
+	def with_any_ingredients(self, names):
+		"""Recipes using at least one of ``names``."""
+		names, links = self._with_ingredients(names)
+		if not names:
+			return self.none()
+		return self.filter(pk__in=links.values('recipe_id'))
+
+	def with_all_ingredients(self, names):
+		"""Recipes using every one of ``names``."""
+		names, links = self._with_ingredients(names)
+		if not names:
+			return self.all()
+		matching = (
+			links.values('recipe_id')
+			.annotate(matched=Count('ingredient_id'))
+			.filter(matched=len(names))
+			.values('recipe_id')
+		)
+		return self.filter(pk__in=matching)
 
 
 class Recipe(models.Model):
@@ -14,30 +83,97 @@ class Recipe(models.Model):
 	ingredients = models.TextField(help_text='Comma-separated list of ingredients')
 	description = models.TextField(blank=True)
 	pic = models.ImageField(upload_to='recipes', default='no_picture.jpg')
+	# normalized copy of `ingredients`, kept in sync on save, for indexed queries
+	ingredient_items = models.ManyToManyField(
+		Ingredient, through='RecipeIngredient', related_name='recipes', blank=True,
+	)
+
+	# computed on save from cooking_time and ingredients, so they can be
+	# filtered and sorted in SQL (see the backfill_recipe_stats command)
+	ingredient_count = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+	difficulty_level = models.CharField(
+		max_length=12, choices=DIFFICULTY_CHOICES, blank=True, db_index=True, editable=False,
+	)
+
+	objects = RecipeQuerySet.as_manager()
 
 	def __str__(self) -> str:
 		return self.name
 
+	def save(self, *args, **kwargs):
+		self.update_stats()
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None:
+			kwargs['update_fields'] = {*update_fields, 'ingredient_count', 'difficulty_level'}
+		super().save(*args, **kwargs)
+		if update_fields is None or 'ingredients' in update_fields:
+			self.sync_ingredients()
+
+	def update_stats(self) -> None:
+		"""Recompute the stored ingredient_count and difficulty_level."""
+		self.ingredient_count = len(self.ingredients_list())
+		self.difficulty_level = compute_difficulty(self.cooking_time, self.ingredient_count)
+
+	def sync_ingredients(self) -> None:
+		"""Make the RecipeIngredient rows match the `ingredients` string."""
+		names = canonical_ingredients(self.ingredients)
+		existing = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+		missing = [Ingredient(name=name) for name in names if name not in existing]
+		if missing:
+			Ingredient.objects.bulk_create(missing, ignore_conflicts=True)
+			existing = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+
+		wanted = {existing[name]: position for position, name in enumerate(names)}
+		current = dict(self.recipe_ingredients.values_list('ingredient_id', 'position'))
+		if current == wanted:
+			return
+		self.recipe_ingredients.exclude(ingredient_id__in=wanted).delete()
+		RecipeIngredient.objects.bulk_create(
+			[RecipeIngredient(recipe=self, ingredient_id=ingredient_id, position=position)
+			 for ingredient_id, position in wanted.items()],
+			update_conflicts=True,
+			unique_fields=['recipe', 'ingredient'],
+			update_fields=['position'],
+		)
+
 	# Helper methods (not stored in DB)
 	def ingredients_list(self) -> list[str]:
 		"""Return ingredients as a normalized list of strings from CSV."""
-		if not self.ingredients:
-			return []
-		return [item.strip() for item in self.ingredients.split(',') if item.strip()]
+		return parse_ingredients(self.ingredients)
 
 	def difficulty(self) -> str:
-		"""Compute difficulty based on cooking time and number of ingredients.
+		"""Difficulty based on cooking time and number of ingredients.
 
-		Easy: cooking_time < 10 and ingredients < 4
-		Medium: cooking_time < 10 and ingredients >= 4
-		Intermediate: cooking_time >= 10 and ingredients < 4
-		Hard: otherwise
+		The value stored on save is returned when there is one; otherwise
+		(unsaved, or not backfilled yet) it is computed, see compute_difficulty.
 		"""
-		num_ingredients = len(self.ingredients_list())
-		if self.cooking_time < 10 and num_ingredients < 4:
-			return 'Easy'
-		if self.cooking_time < 10 and num_ingredients >= 4:
-			return 'Medium'
-		if self.cooking_time >= 10 and num_ingredients < 4:
-			return 'Intermediate'
-		return 'Hard'
+		if self.difficulty_level:
+			return self.difficulty_level
+		return compute_difficulty(self.cooking_time, len(self.ingredients_list()))
+
+
+class RecipeIngredient(models.Model):
+	"""Link between a recipe and one of its ingredients."""
+
+	# both foreign keys are indexed by the constraint and the index below
+	recipe = models.ForeignKey(
+		Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients', db_index=False,
+	)
+	# first in its index, for "recipes with X"
+	ingredient = models.ForeignKey(
+		Ingredient, on_delete=models.CASCADE, related_name='recipe_ingredients', db_index=False,
+	)
+	# place of the ingredient in the comma-separated string
+	position = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		ordering = ['recipe', 'position']
+		constraints = [
+			models.UniqueConstraint(fields=['recipe', 'ingredient'], name='recipe_ingredient_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['ingredient', 'recipe'], name='ingredient_recipe_idx'),
+		]
+
+	def __str__(self) -> str:
+		return f'{self.recipe} - {self.ingredient}'
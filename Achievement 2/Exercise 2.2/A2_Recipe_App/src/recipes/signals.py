@@ -0,0 +1,22 @@
+"""Signal receivers of the recipes app, connected in RecipesConfig.ready()."""
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .images import schedule_derivatives
+from .models import Recipe
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_picture_saving(sender, instance, **kwargs):
+	"""Remember the picture of the recipe before the save."""
+	instance._previous_pic = None
+	if instance.pk is not None:
+		instance._previous_pic = sender.objects.filter(pk=instance.pk).values_list('pic', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_picture_saved(sender, instance, created, **kwargs):
+	"""Make the thumbnails of a new picture."""
+	# the thumbnails of an unchanged picture are there already
+	if created or instance.pic.name != getattr(instance, '_previous_pic', None):
+		schedule_derivatives(instance.pic.name)
@@ -1,5 +1,17 @@
-from django.test import TestCase
-from .models import Recipe
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from .images import derivative_name
+from .models import Ingredient, Recipe
 
 
 class RecipeModelTest(TestCase):
@@ -102,3 +114,124 @@ class RecipeModelTest(TestCase):
         ingredients = recipe.ingredients_list()
         self.assertEqual(ingredients, ["salt", "pepper", "garlic"])
 
+
+
+class IngredientQueryTest(TestCase):
+    """Test cases for the normalized ingredients and the ANY/ALL helpers."""
+
+    def setUp(self):
+        self.soup = Recipe.objects.create(name="Soup", cooking_time=15, ingredients="Broth, salt, pepper")
+        self.cake = Recipe.objects.create(name="Cake", cooking_time=40, ingredients="flour, unsalted butter, sugar")
+        self.bread = Recipe.objects.create(name="Bread", cooking_time=60, ingredients="flour, salt, water")
+
+    def names(self, queryset):
+        return sorted(recipe.name for recipe in queryset)
+
+    def test_ingredients_are_normalized(self):
+        self.assertEqual(
+            list(self.soup.ingredient_items.order_by('recipe_ingredients__position').values_list('name', flat=True)),
+            ["broth", "salt", "pepper"],
+        )
+        # shared between recipes, stored once
+        self.assertEqual(Ingredient.objects.filter(name="flour").count(), 1)
+
+    def test_any_has_no_substring_false_positives(self):
+        self.assertEqual(self.names(Recipe.objects.with_any_ingredients(["Salt"])), ["Bread", "Soup"])
+        self.assertEqual(self.names(Recipe.objects.with_any_ingredients(["water", "sugar"])), ["Bread", "Cake"])
+        self.assertEqual(self.names(Recipe.objects.with_any_ingredients([])), [])
+
+    def test_all(self):
+        self.assertEqual(self.names(Recipe.objects.with_all_ingredients(["flour", "salt"])), ["Bread"])
+        self.assertEqual(self.names(Recipe.objects.with_all_ingredients(["flour", "pepper"])), [])
+
+    def test_editing_the_string_updates_the_links(self):
+        self.soup.ingredients = "broth, pepper, Leek"
+        self.soup.save()
+        self.assertEqual(self.names(Recipe.objects.with_any_ingredients(["salt"])), ["Bread"])
+        self.assertEqual(self.names(Recipe.objects.with_any_ingredients(["leek"])), ["Soup"])
+        self.assertEqual(self.soup.ingredients_list(), ["broth", "pepper", "Leek"])
+
+    def test_match_is_one_indexed_query(self):
+        with CaptureQueriesContext(connection) as captured:
+            list(Recipe.objects.with_all_ingredients(["flour", "salt"]))
+        self.assertEqual(len(captured), 1)
+        plan = Recipe.objects.with_all_ingredients(["flour", "salt"]).explain()
+        self.assertNotIn("SCAN recipes_recipeingredient", plan)
+        self.assertIn("ingredient_recipe_idx", plan)
+
+
+class RecipeStatsTest(TestCase):
+    """Test cases for the stored ingredient count and difficulty."""
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(name="Tea", cooking_time=5, ingredients="tea, water")
+
+    def test_stored_on_save(self):
+        self.assertEqual(self.recipe.ingredient_count, 2)
+        self.assertEqual(self.recipe.difficulty_level, "Easy")
+
+        self.recipe.cooking_time = 12
+        self.recipe.save(update_fields=["cooking_time"])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.difficulty_level, "Intermediate")
+
+    def test_difficulty_filter_is_sql(self):
+        Recipe.objects.create(name="Stew", cooking_time=90, ingredients="beef, carrot, onion, wine")
+        with CaptureQueriesContext(connection) as captured:
+            names = list(Recipe.objects.filter(difficulty_level="Hard").values_list("name", flat=True))
+        self.assertEqual(names, ["Stew"])
+        self.assertEqual(len(captured), 1)
+        self.assertIn("difficulty_level", Recipe.objects.filter(difficulty_level="Hard").explain())
+
+    def test_difficulty_without_stored_value(self):
+        Recipe.objects.update(difficulty_level="", ingredient_count=0)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.difficulty(), "Easy")
+
+    def test_backfill_command(self):
+        Recipe.objects.update(difficulty_level="", ingredient_count=0)
+        out = StringIO()
+        call_command("backfill_recipe_stats", stdout=out)
+        self.assertIn("Updated 1 recipes", out.getvalue())
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.ingredient_count, self.recipe.difficulty_level), (2, "Easy"))
+
+        call_command("backfill_recipe_stats", stdout=out)
+        self.assertIn("Updated 0 recipes", out.getvalue())
+
+
+class RecipePictureTest(TestCase):
+    """Thumbnails of the recipe pictures (recipes/images.py)."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def picture(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue(), name='soup.jpg')
+
+    def test_thumbnails_of_a_new_picture(self):
+        recipe = Recipe(name='Soup', cooking_time=20, ingredients='water, salt')
+        recipe.pic.save('soup.jpg', self.picture((400, 300)), save=False)
+        recipe.save()
+        name = recipe.pic.name
+        for width in (150, 300):
+            self.assertTrue(default_storage.exists(derivative_name(name, width)))
+            self.assertTrue(default_storage.exists(derivative_name(name, width, 'webp')))
+        # wider than the picture
+        self.assertFalse(default_storage.exists(derivative_name(name, 600)))
+
+    def test_unchanged_picture_is_not_reprocessed(self):
+        recipe = Recipe(name='Soup', cooking_time=20, ingredients='water, salt')
+        recipe.pic.save('soup.jpg', self.picture((400, 300)), save=False)
+        recipe.save()
+        thumbnail = derivative_name(recipe.pic.name, 150, 'webp')
+        default_storage.delete(thumbnail)
+        recipe.cooking_time = 25
+        recipe.save()
+        self.assertFalse(default_storage.exists(thumbnail))
@@ -51,3 +51,10 @@ class AdminTests(TestCase):
         # Check that the Difficulty column header and computed value are present
         self.assertContains(response, 'Difficulty')
         self.assertContains(response, self.recipe.difficulty())
+
+    def test_admin_difficulty_filter(self):
+        self.client.login(username=self.admin_username, password=self.admin_password)
+        Recipe.objects.create(name='Slow Roast', cooking_time=120, ingredients='lamb, garlic, rosemary, salt')
+        response = self.client.get('/admin/recipes/recipe/', {'difficulty_level': 'Hard'})
+        self.assertContains(response, 'Slow Roast')
+        self.assertNotContains(response, 'Test Recipe')